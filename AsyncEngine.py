@@ -0,0 +1,303 @@
+#! /usr/bin/env python3
+#
+# Run every glider's dialog reader and parser on one asyncio event loop
+#
+# The threaded engine uses a MonitorGlider, ParseDialog, Sensors, and
+# DownloadFiles thread per glider. Here the node dialog streams are read by
+# async subprocess readers and parsed on the loop, sensor writes go to a
+# bounded executor, serialized per glider, and harvests go to a second
+# bounded executor. Position CSV writes, checkpoints, and rsync requests go
+# through the same per glider work queue, so nothing on the loop blocks.
+# Parsing and writing use the same code as the threads, so the outputs are
+# identical.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import asyncio
+import atexit
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from TPWUtils.Thread import Thread
+from ParseDialog import ParseDialog, mkPositionWriter
+from PositionWriter import PositionWriter
+from Sensors import Sensors
+from DownloadFiles import DownloadFiles
+from Stats import counters
+from DialogArchive import DialogArchive, readDialog
+from Reconnect import backoff, ReplayFilter
+
+class AsyncSensors:
+    ''' Sensors interface for ParseDialog, blocking writes go to the glider's work queue '''
+    def __init__(self, sensors:Sensors, work:asyncio.Queue) -> None:
+        self.__sensors = sensors
+        self.__work = work
+
+    def put(self, name:str, units:str, val:float, t:float) -> None:
+        self.__sensors.update(name, units, val, t)
+
+    def devices(self) -> None:
+        record = self.__sensors.record() # Snapshot on the loop, write in the executor
+        if record: self.__work.put_nowait((self.__sensors.write, record))
+
+    def checkpoint(self, parserState:dict, done=None) -> None:
+        self.__work.put_nowait((self.__sensors.saveState, (parserState,)))
+        if done is not None: self.__work.put_nowait((done.set, ()))
+
+class AsyncPositions:
+    ''' PositionWriter interface for ParseDialog, writes and sends go to the glider's work queue '''
+    def __init__(self, writer:PositionWriter, sendTo:list, work:asyncio.Queue) -> None:
+        self.__writer = writer
+        self.__sendTo = sendTo
+        self.__work = work
+
+    @property
+    def filename(self) -> str:
+        return self.__writer.filename
+
+    def timeout(self) -> float:
+        return self.__writer.timeout() # May lag the executor a little, an early flush is harmless
+
+    def __run(self, func, *params) -> None: # In the executor
+        filenames = func(*params)
+        if self.__sendTo:
+            for fn in filenames:
+                for tgt in self.__sendTo:
+                    tgt.put(fn) # May wait for room in the target's queue
+
+    def append(self, t:float, lat:float, lon:float) -> list:
+        self.__work.put_nowait((self.__run, (self.__writer.append, t, lat, lon)))
+        return [] # Sent from the executor
+
+    def flush(self) -> list:
+        self.__work.put_nowait((self.__run, (self.__writer.flush,)))
+        return []
+
+    def close(self) -> list:
+        self.__work.put_nowait((self.__run, (self.__writer.close,)))
+        return []
+
+class AsyncDownload:
+    ''' DownloadFiles interface for ParseDialog, harvests run in an executor '''
+    def __init__(self, download:DownloadFiles, args:ArgumentParser,
+            executor:ThreadPoolExecutor) -> None:
+        self.__download = download
+        self.__args = args
+        self.__executor = executor
+        self.__qScheduled = False # A harvest is waiting to start
+        self.__qRunning = False
+        self.__qPending = False # Triggered while a harvest was running
+        self.__task = None # Keep a reference so the task is not garbage collected
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.__qRunning = True # Hold off triggers until the state is loaded
+        await loop.run_in_executor(self.__executor, self.__download.prepare)
+        await self.__harvest()
+
+    async def __harvest(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.__qScheduled = False
+        self.__qRunning = True
+        try:
+            await loop.run_in_executor(self.__executor, self.__download.harvest)
+        except:
+            logging.exception("Harvesting")
+        finally:
+            self.__qRunning = False
+        if self.__qPending:
+            self.__qPending = False
+            self.put()
+
+    def put(self) -> None:
+        if self.__qRunning:
+            self.__qPending = True
+        elif not self.__qScheduled:
+            self.__qScheduled = True
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.__args.downloadDelay, self.__startHarvest)
+
+    def __startHarvest(self) -> None:
+        self.__task = asyncio.get_running_loop().create_task(self.__harvest())
+
+class AsyncEngine(Thread):
+    def __init__(self, args:ArgumentParser, sendTo:list, scheduler=None, compactor=None) -> None:
+        Thread.__init__(self, "Async", args)
+        self.__sendTo = sendTo
+        self.__scheduler = scheduler
+        self.__compactor = compactor
+        self.__loop = None
+        self.__gliders = [] # (parser, work queue)
+        self.__qClosing = False
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="asyncio engine options")
+        grp.add_argument("--engine", type=str, default="threads", choices=("threads", "asyncio"),
+                help="Run each glider in its own threads or all gliders on one event loop")
+        grp.add_argument("--asyncWorkers", type=int, default=4,
+                help="Threads for blocking sensor file writes")
+        grp.add_argument("--asyncDownloads", type=int, default=4,
+                help="Threads for simultaneous file harvests")
+        grp.add_argument("--asyncBacklog", type=int, default=100,
+                help="Pending sensor writes per glider before its dialog reader waits")
+        return parser
+
+    async def __worker(self, work:asyncio.Queue, executor:ThreadPoolExecutor) -> None:
+        ''' Run a glider's blocking work in order '''
+        loop = asyncio.get_running_loop()
+        while True:
+            (func, params) = await work.get()
+            try:
+                try:
+                    future = loop.run_in_executor(executor, func, *params)
+                except RuntimeError: # Executors are shut down at exit, before atexit handlers
+                    func(*params)
+                else:
+                    await future
+            finally:
+                work.task_done()
+
+    async def __flusher(self, sensors:Sensors, work:asyncio.Queue) -> None:
+        ''' Flush buffered sensor records once they are old enough '''
+        interval = max(1, min(10, self.args.sensorFlushInterval))
+        while True:
+            dt = sensors.timeout()
+            await asyncio.sleep(interval if dt is None else max(dt, 0.1))
+            if sensors.timeout() == 0: work.put_nowait((sensors.flush, ()))
+
+    async def __parserTimer(self, parser:ParseDialog) -> None:
+        ''' Flush buffered positions and checkpoint once they are due, the writes are small '''
+        interval = 10
+        for dt in (self.args.csvFlushInterval, self.args.checkpointInterval):
+            if dt > 0: interval = max(1, min(interval, dt))
+        while True:
+            dt = parser.timeout()
+            await asyncio.sleep(interval if dt is None else max(dt, 0.1))
+            parser.due()
+
+    async def __dialog(self, glider:str, parser:ParseDialog, work:asyncio.Queue) -> None:
+        args = self.args
+        counts = counters(glider)
+        trace = args.trace
+        backlog = args.asyncBacklog
+        process = parser.process
+        skip = parser.skip
+        qCheckpoint = parser.checkpointing
+        archive = None
+        if args.archiveDir and not args.replay:
+            archive = DialogArchive(glider, args)
+
+        async def handle(line:bytes) -> None:
+            if self.__qClosing: return # Past the final high-water mark
+            if skip(line): return # Processed before a restart
+            counts["lines"] += 1
+            if trace and not (counts["lines"] % trace):
+                logging.info("Line %s %s", glider, line)
+            if archive: archive.write(line)
+            process(line)
+            if qCheckpoint: parser.due()
+            if work.qsize() >= backlog: await work.join() # Backpressure on the reader
+
+        if args.replay:
+            for line in readDialog(args.replay, args.replayStart, args.replayStop):
+                await handle(line)
+            await work.join()
+            return
+
+        cmd = (args.node,
+                os.path.join(args.API, "output_glider_dialog_data.js"),
+                glider,
+                )
+
+        logging.info("Starting %s", cmd)
+
+        dedupe = ReplayFilter(glider, args.dedupeWindow) if args.dedupeWindow > 0 else None
+        attempt = 0 # Reconnects since the stream was last up for a while
+        loop = asyncio.get_running_loop()
+        for cnt in range(args.reconnect):
+            if cnt:
+                dt = backoff(args.reconnectDelay, args.reconnectMaxDelay, attempt)
+                logging.info("Reconnecting %s in %.1f seconds", glider, dt)
+                await asyncio.sleep(dt)
+                counts["reconnects"] += 1
+                if dedupe:
+                    for line in dedupe.reconnected(): await handle(line)
+            logging.info("cnt %s cmd %s", cnt, cmd)
+            t0 = loop.time()
+            proc = await asyncio.create_subprocess_exec(*cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    limit=2**20,
+                    )
+            while True:
+                line = await proc.stdout.readline()
+                if not line: break
+                if dedupe:
+                    for line in dedupe.filter(line): await handle(line)
+                else:
+                    await handle(line)
+            await proc.wait()
+            attempt = 1 if loop.time() - t0 >= args.reconnectMaxDelay else attempt + 1
+        raise Exception(f"To many reconnection attempts for {glider}, {cnt}")
+
+    async def __main(self) -> None:
+        args = self.args
+        writers = ThreadPoolExecutor(max_workers=max(1, args.asyncWorkers),
+                thread_name_prefix="AW")
+        harvesters = ThreadPoolExecutor(max_workers=max(1, args.asyncDownloads),
+                thread_name_prefix="AD")
+        readers = []
+        tasks = []
+        for glider in args.glider:
+            work = asyncio.Queue()
+            sensors = Sensors(glider, args, self.__sendTo, self.__compactor)
+            sensors.prepare()
+            download = AsyncDownload(
+                    DownloadFiles(glider, args, self.__sendTo, self.__scheduler),
+                    args, harvesters)
+            # With track products, they are sent instead of the position CSVs
+            positions = AsyncPositions(mkPositionWriter(glider, args),
+                    [] if args.productDir else self.__sendTo, work)
+            parser = ParseDialog(glider, args, [], AsyncSensors(sensors, work), download,
+                    writer=positions)
+            parser.prepare()
+            tasks.append(asyncio.create_task(self.__worker(work, writers)))
+            if args.sensorFlushInterval > 0:
+                tasks.append(asyncio.create_task(self.__flusher(sensors, work)))
+            if args.csvFlushInterval > 0 or parser.checkpointing:
+                tasks.append(asyncio.create_task(self.__parserTimer(parser)))
+            tasks.append(asyncio.create_task(download.start()))
+            readers.append(asyncio.create_task(self.__dialog(glider, parser, work)))
+            self.__gliders.append((parser, work))
+
+        self.__loop = asyncio.get_running_loop()
+        # After the sensors and parsers registered theirs, so this runs first
+        atexit.register(self.close)
+        logging.info("Running %s gliders", len(readers))
+        # A failure in any task stops the engine, like an exception in a thread
+        await asyncio.gather(*readers, *tasks)
+
+    async def __finish(self) -> None:
+        ''' Stop parsing, then write buffered positions and the final checkpoints '''
+        self.__qClosing = True
+        for (parser, work) in self.__gliders:
+            parser.finish() # Queues the checkpoint behind the pending sensor writes
+        for (parser, work) in self.__gliders:
+            await work.join()
+
+    def close(self) -> None:
+        ''' Finish on the loop, which owns the parsers, called at exit '''
+        loop = self.__loop
+        if loop is None or not loop.is_running(): return
+        future = asyncio.run_coroutine_threadsafe(self.__finish(), loop)
+        try:
+            future.result(timeout=30)
+        except TimeoutError: # e.g. waiting on a stalled rsync target
+            logging.warning("Timed out waiting for the parsers to finish")
+        except:
+            logging.exception("Finishing")
+
+    def runIt(self): # Called on start
+        asyncio.run(self.__main())
@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+#
+# Rewrite finished or rotated sensors NetCDF files into read-optimized chunks
+#
+# The live writer appends one batch at a time along an unlimited time dimension.
+# Compaction copies a finished file into a fixed time dimension with large
+# compressed chunks, then atomically replaces the original. The Compactor runs
+# each rewrite in a child process, so it shares neither HDF5 state nor its
+# lock with the live writers, which carry on appending.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import logging
+import subprocess
+import sys
+import os
+import queue
+from netCDF4 import Dataset
+from TPWUtils.Thread import Thread
+
+def compact(fn:str, chunk:int=4096, complevel:int=4, shuffle:bool=True) -> None:
+    ''' Rewrite fn in place with chunks of up to chunk records along time '''
+    tfn = fn + ".compacting" # Next to fn for an atomic replace, rsync excludes it
+    with Dataset(fn, "r") as src:
+        n = len(src.dimensions["time"]) if "time" in src.dimensions else 0
+        if not n: # A fixed dimension of length 0 would be unlimited
+            logging.info("Not compacting %s, it has no records", fn)
+            return
+        with Dataset(tfn, "w", format="NETCDF4") as dst:
+            dst.createDimension("time", n)
+            opts = dict(
+                    compression="zlib" if complevel > 0 else None,
+                    complevel=complevel if complevel > 0 else 4,
+                    shuffle=shuffle and complevel > 0,
+                    chunksizes=(min(n, chunk),),
+                    )
+            dst.setncatts({key: src.getncattr(key) for key in src.ncattrs()})
+            for name in src.variables:
+                var = src[name]
+                fill = var.getncattr("_FillValue") if "_FillValue" in var.ncattrs() else None
+                out = dst.createVariable(name, var.dtype, var.dimensions,
+                        fill_value=fill, **opts)
+                out.setncatts({key: var.getncattr(key) for key in var.ncattrs() if key != "_FillValue"})
+                out[:] = var[:]
+    os.replace(tfn, fn)
+    logging.info("Compacted %s, %s records", fn, n)
+
+class Compactor(Thread):
+    def __init__(self, args:ArgumentParser, sendTo:list) -> None:
+        Thread.__init__(self, "Compactor", args)
+        self.__sendTo = sendTo
+        self.__queue = queue.Queue()
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Sensor file compaction options")
+        grp.add_argument("--compactChunk", type=int, default=4096,
+                help="Records per chunk in compacted sensor files")
+        grp.add_argument("--compactLevel", type=int, default=4,
+                help="zlib compression level for compacted sensor files, 0 disables")
+        return parser
+
+    def put(self, fn:str) -> None:
+        self.__queue.put(fn)
+
+    def __compact(self, fn:str) -> None:
+        ''' Compact fn in a child process, away from the writers' HDF5 library '''
+        args = self.args
+        cmd = (sys.executable, os.path.abspath(__file__),
+                f"--compactChunk={args.compactChunk}",
+                f"--compactLevel={args.compactLevel}",
+                fn)
+        sp = subprocess.run(cmd, shell=False, capture_output=True)
+        output = str(sp.stdout + sp.stderr, "utf-8", errors="replace").strip()
+        if sp.returncode:
+            raise Exception(f"{cmd} returned {sp.returncode}, {output}")
+        if output: logging.info("%s", output)
+
+    def runIt(self): # Called on start
+        args = self.args
+        q = self.__queue
+        logging.info("Starting")
+
+        while True:
+            fn = q.get()
+            try:
+                self.__compact(fn)
+                if self.__sendTo:
+                    for tgt in self.__sendTo:
+                        tgt.put(args.sensorDir)
+            except:
+                logging.exception("Unable to compact %s", fn)
+            q.task_done()
+
+if __name__ == "__main__":
+    from TPWUtils import Logger
+
+    parser = ArgumentParser()
+    parser.add_argument("filename", type=str, nargs="+", help="Sensors NetCDF file(s) to compact")
+    Logger.addArgs(parser)
+    Compactor.addArgs(parser)
+    args = parser.parse_args()
+
+    Logger.mkLogger(args, logLevel=logging.INFO)
+
+    for fn in args.filename:
+        compact(fn, args.compactChunk, args.compactLevel)
@@ -0,0 +1,258 @@
+#! /usr/bin/env python3
+#
+# Append only, per glider, archive of the raw dialog
+#
+# glider.dialog.gz is a series of gzip members, each holding a block of
+# dialog lines, so zcat reads the whole thing. glider.dialog.idx has a line
+# per member:
+#   offset length tStart tStop nLines
+# where tStart is the glider time, from Curr Time:, in effect at the start of
+# the block and tStop the last one seen in it, both in UNIX seconds, nan if
+# not known yet. A reader seeks straight to the members overlapping a time
+# window instead of decompressing the whole deployment.
+#
+# A member is written once it holds --archiveBlock bytes or is --archiveInterval
+# seconds old. One thread, shared by every archive, writes the members of idle
+# streams. The index line is written after its member, so on restart any member
+# without an index line is truncated away.
+#
+# Lines are split on newlines only, as the live stream is, so replayed dialog
+# has the same lines even when it holds stray carriage returns.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+import logging
+import threading
+import heapq
+import io
+import atexit
+import zlib
+import gzip
+import mmap
+import math
+import time
+import re
+import os
+
+currTime = re.compile(rb"^Curr Time: \w+ (\w+\s+\d+\s+\d{2}:\d{2}:\d{2}\s+\d{4})")
+
+_deadlines = [] # Heap of (when, sequence, func, param) for blocks of idle streams
+_cond = threading.Condition()
+_sequence = 0
+_thread = None
+
+def _expire() -> None:
+    ''' Call func(param) for each block once it is due '''
+    while True:
+        with _cond:
+            while not _deadlines or _deadlines[0][0] > time.time():
+                _cond.wait(_deadlines[0][0] - time.time() if _deadlines else None)
+            (when, sequence, func, param) = heapq.heappop(_deadlines)
+        func(param)
+
+def _expireAt(when:float, func, param) -> None:
+    global _sequence, _thread
+    with _cond:
+        if _thread is None:
+            _thread = threading.Thread(target=_expire, name="Archive", daemon=True)
+            _thread.start()
+        _sequence += 1
+        heapq.heappush(_deadlines, (when, _sequence, func, param))
+        _cond.notify()
+
+def gliderTime(line:bytes) -> float:
+    ''' Glider time in a Curr Time: line, None for other lines '''
+    if not line.startswith(b"Curr Time:"): return None
+    matches = currTime.match(line)
+    if not matches: return None
+    return datetime.strptime(str(matches[1], "utf-8"), "%b %d %H:%M:%S %Y") \
+            .replace(tzinfo=timezone.utc).timestamp()
+
+def parseTime(val:str) -> float:
+    ''' ISO 8601 or UNIX seconds to UNIX seconds, naive times are UTC '''
+    try:
+        return float(val)
+    except ValueError:
+        pass
+    t = datetime.fromisoformat(val)
+    if t.tzinfo is None: t = t.replace(tzinfo=timezone.utc)
+    return t.timestamp()
+
+def filenames(directory:str, glider:str) -> tuple:
+    base = os.path.join(directory, glider + ".dialog")
+    return (base + ".gz", base + ".idx")
+
+def indexName(fn:str) -> str:
+    ''' Sidecar index for an archive, None if fn is not an archive '''
+    if not fn.endswith(".dialog.gz"): return None
+    ifn = fn[:-3] + ".idx"
+    return ifn if os.path.isfile(ifn) else None
+
+def loadIndex(ifn:str) -> list:
+    ''' [(offset, length, tStart, tStop, nLines), ...] '''
+    entries = []
+    with open(ifn, "r") as fp:
+        for line in fp:
+            fields = line.split()
+            if len(fields) != 5: continue # Partial last line
+            entries.append((int(fields[0]), int(fields[1]),
+                float(fields[2]), float(fields[3]), int(fields[4])))
+    return entries
+
+def overlaps(tStart:float, tStop:float, start:float, stop:float) -> bool:
+    if start is not None and not math.isnan(tStop) and tStop < start: return False
+    if stop is not None and not math.isnan(tStart) and tStart > stop: return False
+    return True
+
+def readArchive(fn:str, start:float=None, stop:float=None):
+    ''' Generate the lines of an archive with glider times in [start, stop] '''
+    entries = loadIndex(fn[:-3] + ".idx")
+    qAll = start is None and stop is None
+    with open(fn, "rb") as fp:
+        for (offset, length, tStart, tStop, nLines) in entries:
+            if not overlaps(tStart, tStop, start, stop): continue
+            fp.seek(offset)
+            block = zlib.decompress(fp.read(length), wbits=31)
+            if qAll:
+                yield from io.BytesIO(block) # Only splits on newlines
+                continue
+            t = None if math.isnan(tStart) else tStart
+            for line in io.BytesIO(block):
+                tLine = gliderTime(line)
+                if tLine is not None: t = tLine
+                if t is None: continue
+                if start is not None and t < start: continue
+                if stop is not None and t > stop: continue
+                yield line
+
+def readDialog(fn:str, start:float=None, stop:float=None):
+    ''' Generate the lines of an archive, gzipped, or plain dialog file '''
+    if indexName(fn):
+        yield from readArchive(fn, start, stop)
+        return
+    if start is not None or stop is not None:
+        logging.warning("%s is not indexed, so it is not filtered by time", fn)
+    if fn.endswith(".gz"):
+        with gzip.open(fn, "rb") as fp:
+            yield from fp
+        return
+    with open(fn, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0: return # Can not mmap an empty file
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+class DialogArchive:
+    def __init__(self, glider:str, args:ArgumentParser) -> None:
+        self.__blockSize = args.archiveBlock
+        self.__interval = args.archiveInterval
+        self.__level = args.archiveLevel
+        (self.__fn, self.__ifn) = filenames(args.archiveDir, glider)
+        self.__lines = []
+        self.__size = 0
+        self.__tBlock = None # When the current block was started
+        self.__t = math.nan # Most recent glider time
+        self.__tStart = math.nan # Glider time at the start of the block
+        self.__lock = threading.Lock() # Reader, timer, and atexit
+        if not os.path.isdir(args.archiveDir):
+            logging.info("Creating %s", args.archiveDir)
+            os.makedirs(args.archiveDir, mode=0o755, exist_ok=True)
+        self.__offset = self.__recover()
+        logging.info("Archiving to %s at %s", self.__fn, self.__offset)
+        atexit.register(self.close)
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Raw dialog archive options")
+        grp.add_argument("--archiveDir", type=str,
+                help="Where to archive the raw dialog, not archived if not specified")
+        grp.add_argument("--archiveBlock", type=int, default=65536,
+                help="Bytes of dialog per compressed block")
+        grp.add_argument("--archiveInterval", type=float, default=600,
+                help="Maximum seconds to buffer dialog before writing a block")
+        grp.add_argument("--archiveLevel", type=int, default=6,
+                help="gzip compression level")
+        return parser
+
+    def __recover(self) -> int:
+        ''' Drop anything after the last indexed block, returns where to append '''
+        entries = loadIndex(self.__ifn) if os.path.isfile(self.__ifn) else []
+        size = os.path.getsize(self.__fn) if os.path.isfile(self.__fn) else 0
+        while entries and entries[-1][0] + entries[-1][1] > size: entries.pop()
+        offset = entries[-1][0] + entries[-1][1] if entries else 0
+        if entries: self.__t = entries[-1][3] if not math.isnan(entries[-1][3]) \
+                else entries[-1][2]
+        if size != offset:
+            logging.warning("Truncating %s from %s to %s", self.__fn, size, offset)
+            with open(self.__fn, "r+b") as fp: fp.truncate(offset)
+        with open(self.__ifn, "w") as fp: # Rewrite without any partial lines
+            for entry in entries: fp.write(self.__indexLine(*entry))
+        return offset
+
+    @staticmethod
+    def __indexLine(offset:int, length:int, tStart:float, tStop:float, nLines:int) -> str:
+        return f"{offset} {length} {tStart:.0f} {tStop:.0f} {nLines}\n"
+
+    def write(self, line:bytes) -> None:
+        with self.__lock:
+            if not self.__lines:
+                self.__tBlock = time.time()
+                self.__tStart = self.__t
+                if self.__interval > 0: # Written even if no more lines arrive
+                    _expireAt(self.__tBlock + self.__interval, self.__expired, self.__tBlock)
+            t = gliderTime(line)
+            if t is not None:
+                self.__t = t
+                if math.isnan(self.__tStart): self.__tStart = t
+            self.__lines.append(line)
+            self.__size += len(line)
+            if self.__size >= self.__blockSize or (time.time() - self.__tBlock) >= self.__interval:
+                self.__flush()
+
+    def __expired(self, tBlock:float) -> None:
+        with self.__lock:
+            if not self.__lines or self.__tBlock != tBlock: return # Already written
+            try:
+                self.__flush()
+            except:
+                logging.exception("Flushing %s", self.__fn)
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self) -> None:
+        if not self.__lines: return
+        block = gzip.compress(b"".join(self.__lines), compresslevel=self.__level, mtime=0)
+        with open(self.__fn, "ab") as fp:
+            fp.write(block)
+        with open(self.__ifn, "a") as fp:
+            fp.write(self.__indexLine(self.__offset, len(block),
+                self.__tStart, self.__t, len(self.__lines)))
+        self.__offset += len(block)
+        self.__lines = []
+        self.__size = 0
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except:
+            logging.exception("Flushing %s", self.__fn)
+
+if __name__ == "__main__":
+    import sys
+    parser = ArgumentParser(description="Extract dialog from archives")
+    parser.add_argument("archive", type=str, nargs="+", help="glider.dialog.gz archive(s)")
+    parser.add_argument("--start", type=str, help="Earliest glider time, ISO 8601 or UNIX seconds")
+    parser.add_argument("--stop", type=str, help="Latest glider time, ISO 8601 or UNIX seconds")
+    parser.add_argument("--output", type=str, help="Output file, otherwise standard output")
+    args = parser.parse_args()
+
+    start = None if args.start is None else parseTime(args.start)
+    stop = None if args.stop is None else parseTime(args.stop)
+
+    with open(args.output, "wb") if args.output else sys.stdout.buffer as ofp:
+        for fn in args.archive:
+            for line in readDialog(fn, start, stop):
+                ofp.write(line)
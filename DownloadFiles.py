@@ -12,7 +12,6 @@ from argparse import ArgumentParser
 import subprocess
 import logging
 import os
-import queue
 import time
 import zipfile
 import json
@@ -21,13 +20,21 @@ from tempfile import TemporaryDirectory
 from datetime import datetime, timezone, timedelta
 from TPWUtils.Thread import Thread
 from SendTo import SendToTarget
+import State
+import NodeWorker
+from Scheduler import Scheduler
+from PolicyQueue import PolicyQueue
+from Stats import counters
 
 class DownloadFiles(Thread):
-    def __init__(self, glider:str, args:ArgumentParser, sendTo:SendToTarget) -> None:
+    def __init__(self, glider:str, args:ArgumentParser, sendTo:SendToTarget,
+            scheduler:Scheduler=None) -> None:
         Thread.__init__(self, "DN:" + glider, args)
         self.__glider = glider
         self.__sendTo = sendTo
-        self.__queue = queue.Queue()
+        self.__scheduler = scheduler
+        self.__counts = counters(glider)
+        self.__queue = PolicyQueue(glider, "download", policy="merge") # One pending trigger
         random.seed(time.time())
 
     @staticmethod
@@ -41,6 +48,8 @@ class DownloadFiles(Thread):
                 help="How long to delay in seconds")
         grp.add_argument("--randomDelay", type=float, default=60,
                 help="Random delay between page fetches in seconds")
+        grp.add_argument("--missingAttempts", type=int, default=3,
+                help="Downloads a listed file may be missing from before it is given up on")
         return parser
 
     def join(self) -> None:
@@ -49,27 +58,48 @@ class DownloadFiles(Thread):
     def put(self) -> None:
         self.__queue.put(None)
 
+    def __node(self, *cmd) -> subprocess.CompletedProcess:
+        ''' Run an SFMC API call, through the shared scheduler if there is one '''
+        if self.__scheduler is None: return NodeWorker.run(self.args, *cmd)
+        return self.__scheduler.run(self.__glider, NodeWorker.run, self.args, *cmd)
+
+    def __loadState(self) -> tuple:
+        ''' Return the cached (fileTimes, high-water mark, harvested, missing) '''
+        state = State.load(self.args, self.__glider + ".download")
+        if not state: return (dict(), None, dict(), dict())
+        files = dict()
+        for (fn, t) in state.get("files", {}).items():
+            files[fn] = datetime.fromtimestamp(t, tz=timezone.utc)
+        tMax = state.get("tMax")
+        if tMax is not None: tMax = datetime.fromtimestamp(tMax, tz=timezone.utc)
+        return (files, tMax, state.get("harvested", {}), state.get("missing", {}))
+
+    def __saveState(self) -> None:
+        files = self.__files
+        State.save(self.args, self.__glider + ".download", dict(
+            files={fn: files[fn].timestamp() for fn in files},
+            tMax=None if self.__tHigh is None else self.__tHigh.timestamp(),
+            harvested=self.__harvested, # name -> [size, mtime] of delivered files
+            missing=self.__missing, # name -> [mtime, attempts] of listed files not downloaded
+            ))
+
     def __fileTimes(self, t0:datetime, files:dict) -> tuple:
         # newest files are in page 0 and oldest in last page
+        # Pages are walked until one reaches back to t0, None walks all of them
         args = self.args
-        files = dict()
+        files = dict(files) # Listing is merged into the known files
         tMin = None
         tMax = None
         page = 0
 
         while True: 
             cmd = (
-                    args.node,
-                    os.path.join(args.API, "get_glider_folder_listing.js"),
+                    "get_glider_folder_listing.js",
                     self.__glider,
                     args.folder,
                     str(page),
                     )
-            sp = subprocess.run(cmd, 
-                    shell=False,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    )
+            sp = self.__node(*cmd)
             if sp.returncode != 0:
                 logging.error("Executing %s", cmd)
                 if sp.stderr: logging.error("STDERR: %s", sp.stderr)
@@ -82,6 +112,8 @@ class DownloadFiles(Thread):
                 logging.exception("Unable to parse %s", sp.stdout)
                 continue
 
+            self.__counts["listPages"] += 1
+
             for item in info["results"]:
                 mtime = datetime.strptime(item["dateTimeModified"], "%Y-%m-%d %H:%M:%S") \
                         .replace(tzinfo=timezone.utc)
@@ -93,80 +125,145 @@ class DownloadFiles(Thread):
             if "next" not in info["links"]: break
 
             page += 1
-            dt = random.uniform(0.5,args.randomDelay)
-            logging.info("Waiting %s seconds to throttle page requests before page %s", dt, page)
-            time.sleep(dt)
+            if self.__scheduler is None: # Otherwise the scheduler throttles requests
+                dt = random.uniform(0.5,args.randomDelay)
+                logging.info("Waiting %s seconds to throttle page requests before page %s", dt, page)
+                time.sleep(dt)
 
         return (files, tMin, tMax)
 
-    def __fetchFiles(self, t0:datetime, fileTimes:dict) -> set:
+    def __fetchFiles(self, t0:datetime, fileTimes:dict, pending:set) -> bool:
         args = self.args
-        fetched = None
         with TemporaryDirectory() as tgtDir:
             fnZip = os.path.join(tgtDir, "__temp__.zip")
             cmd = (
-                    args.node,
-                    os.path.join(args.API, "download_glider_files.js"),
+                    "download_glider_files.js",
                     self.__glider,
                     args.folder,
                     "*.*",
                     (t0 - timedelta(seconds=args.safety)).strftime("%Y%m%d%H%M"),
                     fnZip,
                     )
-            sp = subprocess.run(cmd,
-                    shell=False,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    )
+            sp = self.__node(*cmd)
             if sp.returncode != 0:
                 logging.error("Executing %s", cmd)
                 if sp.stderr: logging.error("STDERR: %s", sp.stderr)
                 if sp.stdout: logging.error("STDOUT: %s", sp.stdout)
-                return None
+                return False
 
             if not os.path.isfile(fnZip):
                 logging.warning("%s was not created!", fnZip)
                 if sp.stderr: logging.warning("STDERR: %s", sp.stderr)
                 if sp.stdout: logging.warning("STDOUT: %s", sp.stdout)
-                return None
+                return False
 
             tgtPath = os.path.join(tgtDir, self.__glider)
             os.makedirs(tgtPath, 0o755, exist_ok=True)
+            harvested = self.__harvested
+            fetched = dict()
             with zipfile.ZipFile(fnZip) as zip:
-                cnt = len(zip.namelist())
-                logging.info("Downloaded %s files in %s", cnt, fnZip)
-                zip.extractall(path=tgtPath)
+                members = zip.infolist()
+                for info in members:
+                    fn = info.filename
+                    if fn in fileTimes:
+                        mtime = fileTimes[fn].timestamp()
+                    else: # Zip times are naive, SFMC's are UTC
+                        mtime = datetime(*info.date_time, tzinfo=timezone.utc).timestamp()
+                    key = [info.file_size, mtime]
+                    if harvested.get(fn) == key: continue # Already delivered
+                    zip.extract(info, path=tgtPath)
+                    os.utime(os.path.join(tgtPath, fn), times=(mtime,mtime))
+                    fetched[fn] = key
+                logging.info("Downloaded %s files in %s, %s new or changed",
+                        len(members), fnZip, len(fetched))
+                self.__noteMissing(pending, set(info.filename for info in members), fileTimes)
+            self.__counts["downloadBytes"] += os.path.getsize(fnZip)
+            self.__counts["downloadFiles"] += len(fetched)
             os.unlink(fnZip)
-            fetched = set()
-            for fn in os.listdir(tgtPath):
-                mtime = fileTimes[fn] if fn in fileTimes else None
-                fetched.add(fn)
-                if not mtime: continue
-                mtime = mtime.timestamp()
-                os.utime(os.path.join(tgtPath, fn), times=(mtime,mtime))
-
-            if self.__sendTo:
-                for tgt in self.__sendTo: tgt.put(tgtPath) # Rsync everything over
+
+            qDelivered = True
+            if fetched and self.__sendTo:
+                for tgt in self.__sendTo: tgt.put(tgtPath, bulk=True) # Rsync new files over
                 # Wait for the rsyncs to finish before we delete directory
                 for tgt in self.__sendTo: 
                     logging.info("Joining %s", tgt)
-                    tgt.join()
+                    if not tgt.join(tgtPath): qDelivered = False
 
-        return fetched
+        if qDelivered: # Otherwise they are fetched and sent again next time
+            harvested.update(fetched)
+        else:
+            logging.warning("Not all targets received %s files, will retry", len(fetched))
+        return qDelivered
+
+    def __noteMissing(self, pending:set, names:set, fileTimes:dict) -> None:
+        ''' Count the downloads pending files were listed for but not in '''
+        missing = self.__missing
+        limit = self.args.missingAttempts
+        for fn in pending:
+            if fn in names:
+                missing.pop(fn, None)
+                continue
+            mtime = fileTimes[fn].timestamp()
+            item = missing.get(fn)
+            if item is None or item[0] != mtime: item = missing[fn] = [mtime, 0]
+            item[1] += 1
+            if item[1] >= limit:
+                logging.warning("Giving up on %s, listed but missing from %s downloads", fn, item[1])
+
+    def harvest(self) -> None:
+        t0 = time.time()
+        try:
+            self.__harvest()
+        finally:
+            self.__counts["harvests"] += 1
+            self.__counts["harvestSeconds"] += time.time() - t0
+
+    def __harvest(self) -> None:
+        # Only walk pages newer than the high-water mark
+        [self.__files, t0, t1] = self.__fileTimes(self.__tHigh, self.__files)
+        logging.info("n %s t0 %s t1 %s", len(self.__files), t0, t1)
+        if t1 is not None:
+            self.__tHigh = t1 if self.__tHigh is None else max(t1, self.__tHigh)
+
+        # Files in the listing which have not been delivered with their current mtime.
+        # Once something has been delivered, like the original fetch window, only
+        # files within safety of the high-water mark are retried.
+        # A file missing from --missingAttempts downloads, at the same mtime, is given up on.
+        files = self.__files
+        harvested = self.__harvested
+        tOld = None
+        if harvested and self.__tHigh is not None:
+            tOld = self.__tHigh - timedelta(seconds=self.args.safety)
+        missing = self.__missing
+        limit = self.args.missingAttempts
+        pending = set(fn for fn in files \
+                if (fn not in harvested or harvested[fn][1] != files[fn].timestamp()) \
+                and (tOld is None or files[fn] >= tOld) \
+                and not (fn in missing and missing[fn][0] == files[fn].timestamp() \
+                    and missing[fn][1] >= limit))
+        if not pending:
+            logging.info("Nothing new to fetch")
+            self.__saveState()
+            return
+
+        # Fetch all the files with times >= oldest pending-safety
+        if self.__fetchFiles(min(files[fn] for fn in pending), files, pending):
+            logging.info("Returned from __fetchFiles")
+        self.__saveState()
+
+    def prepare(self) -> None:
+        ''' Resume from the cached listing and the files already delivered '''
+        logging.info("Starting safety %s", timedelta(seconds=self.args.safety))
+        (self.__files, self.__tHigh, self.__harvested, self.__missing) = self.__loadState()
+        logging.info("Cached n %s tHigh %s harvested %s",
+                len(self.__files), self.__tHigh, len(self.__harvested))
 
     def runIt(self): # Called on start
         q = self.__queue
         args = self.args
-        glider = self.__glider
-        safety = timedelta(seconds=args.safety)
 
-        logging.info("Starting safety %s", safety)
-
-        [fileTimes, t0, t1] = self.__fileTimes(None, dict()) # Get the initial list of files
-        logging.info("t0 %s t1 %s n %s", t0, t1, len(fileTimes))
-        # Fetch all the files with times >= t0-safety
-        if t0 is not None: 
-            self.__fetchFiles(t0, fileTimes) 
+        self.prepare()
+        self.harvest()
 
         while True:
             logging.info("Waiting on queue")
@@ -176,12 +273,7 @@ class DownloadFiles(Thread):
             while not q.empty(): # Eat anything pending
                 q.get()
                 q.task_done()
-
-            [fileTimes, t0, t1] = self.__fileTimes(t1, fileTimes)
-            logging.info("n %s t0 %s t1 %s", len(fileTimes), t0, t1)
-            if t0 is not None:
-                self.__fetchFiles(t0, fileTimes)
-                logging.info("Returned from __fetchFiles")
+            self.harvest()
             q.task_done()
 
 if __name__ == "__main__":
@@ -189,7 +281,9 @@ if __name__ == "__main__":
 
     parser = ArgumentParser()
     Logger.addArgs(parser)
+    State.addArgs(parser)
     DownloadFiles.addArgs(parser)
+    NodeWorker.NodeWorker.addArgs(parser)
     parser.add_argument("glider", type=str, help="Glider to download files for")
     parser.add_argument("--API", type=str, default="./sfmc-rest-programs",
             help="Where SFMC API's Javascripts are")
@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+#
+# Serve the Stats counters and gauges over HTTP in the Prometheus text format
+#
+#  sfmc_events_total{owner,event}    counters, e.g. lines, location, fixes,
+#                                    listPages, downloadBytes, rsyncFailures
+#  sfmc_seconds_total{owner,timer}   accumulated time, e.g. sensorWriteSeconds,
+#                                    harvestSeconds, rsyncSeconds
+#  sfmc_gauge{owner,name}            current values, e.g. dialogQueue, sendBacklog
+#
+# Owners are gliders and rsync targets. Rates, such as lines/sec, and average
+# latencies come from the counters, e.g. rate(sfmc_events_total{event="lines"}[5m])
+#
+# Values are read from the counters without any locking, so the hot paths
+# pay nothing for this.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import logging
+import threading
+import time
+from TPWUtils.Thread import Thread
+from Stats import counters, gliders, gauges
+
+def quote(val:str) -> str:
+    return str(val).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render() -> str:
+    events = []
+    timers = []
+    for owner in gliders():
+        cnts = dict(counters(owner)) # Copying is atomic, so no lock is needed
+        for key in sorted(cnts):
+            if key.endswith("Seconds"):
+                timers.append(f'sfmc_seconds_total{{owner="{quote(owner)}",timer="{quote(key)}"}} {cnts[key]}')
+            else:
+                events.append(f'sfmc_events_total{{owner="{quote(owner)}",event="{quote(key)}"}} {cnts[key]}')
+
+    values = gauges()
+    lines = [
+            "# HELP sfmc_events_total Events counted per glider or target",
+            "# TYPE sfmc_events_total counter",
+            *events,
+            "# HELP sfmc_seconds_total Seconds spent per glider or target",
+            "# TYPE sfmc_seconds_total counter",
+            *timers,
+            "# HELP sfmc_gauge Current values such as queue depths",
+            "# TYPE sfmc_gauge gauge",
+            ]
+    for owner in sorted(values):
+        for name in sorted(values[owner]):
+            lines.append(f'sfmc_gauge{{owner="{quote(owner)}",name="{quote(name)}"}} {values[owner][name]}')
+    lines.extend((
+        "# HELP sfmc_threads Number of threads in this process",
+        "# TYPE sfmc_threads gauge",
+        f"sfmc_threads {threading.active_count()}",
+        "# HELP sfmc_time_seconds When these values were collected",
+        "# TYPE sfmc_time_seconds gauge",
+        f"sfmc_time_seconds {time.time():.3f}",
+        ))
+    return "\n".join(lines) + "\n"
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = bytes(render(), "utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt:str, *args) -> None:
+        logging.debug(fmt, *args)
+
+class Metrics(Thread):
+    def __init__(self, args:ArgumentParser) -> None:
+        Thread.__init__(self, "Metrics", args)
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Metrics endpoint options")
+        grp.add_argument("--metricsPort", type=int, default=0,
+                help="Port to serve Prometheus metrics on, 0 disables")
+        grp.add_argument("--metricsHost", type=str, default="127.0.0.1",
+                help="Address to serve Prometheus metrics on")
+        return parser
+
+    def runIt(self): # Called on start
+        args = self.args
+        if args.metricsPort <= 0: return
+        server = ThreadingHTTPServer((args.metricsHost, args.metricsPort), Handler)
+        server.daemon_threads = True
+        logging.info("Serving metrics on %s:%s", args.metricsHost, args.metricsPort)
+        server.serve_forever()
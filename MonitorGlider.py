@@ -15,6 +15,9 @@ import os
 from TPWUtils import Logger
 from TPWUtils.Thread import Thread
 from ParseDialog import ParseDialog
+from Stats import counters
+from DialogArchive import DialogArchive, readDialog, parseTime
+from Reconnect import backoff, ReplayFilter
 import time
 
 class MonitorGlider(Thread):
@@ -22,6 +25,11 @@ class MonitorGlider(Thread):
         Thread.__init__(self, glider, args)
         self.__gliderName = glider
         self.__parser = parser
+        self.__counts = counters(glider)
+        self.__trace = args.trace # Log every Nth line
+        self.__archive = None
+        if getattr(args, "archiveDir", None) and not args.replay:
+            self.__archive = DialogArchive(glider, args)
 
     @staticmethod
     def addArgs(parser:ArgumentParser) -> ArgumentParser:
@@ -33,20 +41,37 @@ class MonitorGlider(Thread):
                     help="Which node command to execute")
             grp.add_argument("--reconnect", type=int, default=10,
                     help="Number of reconnection attempts to allow")
+            grp.add_argument("--reconnectDelay", type=float, default=1,
+                    help="Seconds before the first reconnect, doubled for each further one")
+            grp.add_argument("--reconnectMaxDelay", type=float, default=300,
+                    help="Most seconds between reconnects, a stream up this long resets the delay")
+            grp.add_argument("--dedupeWindow", type=int, default=10000,
+                    help="Recent dialog lines remembered to drop those sent again on reconnect, 0 disables")
             grp.add_argument("--replay", type=str, help="Input dialog to parse")
+            grp.add_argument("--replayStart", type=parseTime,
+                    help="Earliest glider time to replay from an archive, ISO 8601 or UNIX seconds")
+            grp.add_argument("--replayStop", type=parseTime,
+                    help="Latest glider time to replay from an archive, ISO 8601 or UNIX seconds")
         except:
             pass
         return parser
 
 
+    def __put(self, line:bytes) -> None:
+        if self.__parser.skip(line): return # Processed before a restart
+        counts = self.__counts
+        counts["lines"] += 1
+        if self.__trace and not (counts["lines"] % self.__trace):
+            logging.info("Line %s", line)
+        if self.__archive: self.__archive.write(line)
+        self.__parser.put(line)
+
     def runIt(self): # Called on start
         args = self.args
 
         if args.replay:
-            with open(args.replay, "rb") as fp:
-                for line in fp:
-                    logging.info("Line %s", line)
-                    self.__parser.put(line)
+            for line in readDialog(args.replay, args.replayStart, args.replayStop):
+                self.__put(line)
             time.sleep(10000)
             return
 
@@ -57,8 +82,18 @@ class MonitorGlider(Thread):
 
         logging.info("Starting %s", cmd)
 
+        dedupe = ReplayFilter(self.__gliderName, args.dedupeWindow) if args.dedupeWindow > 0 else None
+        attempt = 0 # Reconnects since the stream was last up for a while
         for cnt in range(args.reconnect):
+            if cnt:
+                dt = backoff(args.reconnectDelay, args.reconnectMaxDelay, attempt)
+                logging.info("Reconnecting in %.1f seconds", dt)
+                time.sleep(dt)
+                self.__counts["reconnects"] += 1
+                if dedupe:
+                    for line in dedupe.reconnected(): self.__put(line)
             logging.info("cnt %s cmd %s", cnt, cmd)
+            t0 = time.time()
             proc = subprocess.Popen(
                     cmd,
                     shell=False,
@@ -67,7 +102,11 @@ class MonitorGlider(Thread):
                     )
             while True:
                 line = proc.stdout.readline()
-                logging.info("Line %s", line)
                 if not line: break
-                self.__parser.put(line)
+                if dedupe:
+                    for line in dedupe.filter(line): self.__put(line)
+                else:
+                    self.__put(line)
+            proc.wait()
+            attempt = 1 if time.time() - t0 >= args.reconnectMaxDelay else attempt + 1
         raise Exception(f"To many reconnection attempts, {cnt}")
@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+#
+# Run SFMC API scripts in one long-lived node worker instead of a fresh
+# node process per call
+#
+# Requests and responses are JSON lines over the worker's stdin/stdout:
+#   {"id": 1, "script": "/path/get_glider_folder_listing.js", "args": ["glider", ...]}
+#   {"id": 1, "returncode": 0, "stdout": "...", "stderr": "..."}
+#
+# One worker is shared by every caller. If it can not be started, or dies,
+# calls fall back to running a node subprocess per call.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import subprocess
+import threading
+import logging
+import json
+import os
+import time
+from TPWUtils.Thread import Thread
+
+class NodeWorker(Thread):
+    __instance = None
+    __instanceLock = threading.Lock()
+    __tRetry = 0 # When to try starting a worker again after one died
+
+    def __init__(self, args:ArgumentParser) -> None:
+        Thread.__init__(self, "NodeWorker", args)
+        self.__lock = threading.Lock() # Serializes writes and the pending table
+        self.__pending = {} # id -> [Event, response]
+        self.__id = 0
+        cmd = (args.node, args.nodeWorker)
+        logging.info("Starting %s", cmd)
+        self.__proc = subprocess.Popen(cmd,
+                shell=False,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                )
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Persistent node worker options")
+        grp.add_argument("--nodeWorker", type=str,
+                help="Node script to keep running for SFMC API calls, e.g. ./sfmc_worker.js")
+        grp.add_argument("--nodeTimeout", type=float, default=900,
+                help="Seconds to wait for a node worker request before giving up on the worker")
+        return parser
+
+    @classmethod
+    def get(cls, args:ArgumentParser):
+        ''' The shared worker, None if there is not a usable one '''
+        if not getattr(args, "nodeWorker", None): return None
+        with cls.__instanceLock:
+            worker = cls.__instance
+            if worker is not None and not worker.is_alive(): # Died, so wait a bit to restart
+                cls.__tRetry = time.time() + 60
+                worker = None
+            if worker is None and time.time() >= cls.__tRetry:
+                try:
+                    worker = cls(args)
+                    worker.start()
+                except:
+                    logging.exception("Unable to start node worker %s", args.nodeWorker)
+                    cls.__tRetry = time.time() + 60
+                    worker = None
+            cls.__instance = worker
+            return worker
+
+    def __fail(self) -> None:
+        ''' Kill the worker and release anyone waiting on it '''
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = {}
+        if self.__proc.poll() is None: self.__proc.kill()
+        for item in pending.values(): item[0].set()
+
+    def request(self, script:str, argv:tuple) -> subprocess.CompletedProcess:
+        ''' Run script in the worker, returns None if the worker failed '''
+        event = threading.Event()
+        item = [event, None]
+        try:
+            with self.__lock:
+                self.__id += 1
+                ident = self.__id
+                self.__pending[ident] = item
+                msg = json.dumps(dict(id=ident, script=script, args=list(argv)))
+                self.__proc.stdin.write(bytes(msg + "\n", "utf-8"))
+                self.__proc.stdin.flush()
+        except:
+            logging.exception("Sending to node worker")
+            self.__fail()
+            return None
+
+        if not event.wait(self.args.nodeTimeout):
+            logging.error("Node worker timed out on %s %s", script, argv)
+            self.__fail()
+            return None
+
+        response = item[1]
+        if response is None: return None
+        return subprocess.CompletedProcess(
+                (script,) + tuple(argv),
+                response.get("returncode", -1),
+                bytes(response.get("stdout", ""), "utf-8"),
+                bytes(response.get("stderr", ""), "utf-8"),
+                )
+
+    def runIt(self): # Called on start, reads responses
+        try:
+            for line in self.__proc.stdout:
+                try:
+                    response = json.loads(line)
+                except:
+                    logging.warning("Unexpected node worker output %s", line)
+                    continue
+                with self.__lock:
+                    item = self.__pending.pop(response.get("id"), None)
+                if item is None: continue
+                item[1] = response
+                item[0].set()
+        finally:
+            logging.warning("Node worker exited, %s", self.__proc.poll())
+            self.__fail()
+
+def run(args:ArgumentParser, script:str, *argv) -> subprocess.CompletedProcess:
+    ''' Run an SFMC API script, via the shared worker if enabled and alive '''
+    fn = os.path.join(args.API, script)
+    worker = NodeWorker.get(args)
+    if worker is not None:
+        sp = worker.request(fn, argv)
+        if sp is not None: return sp
+        logging.warning("Falling back to a node subprocess for %s", script)
+    return subprocess.run((args.node, fn) + argv,
+            shell=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            )
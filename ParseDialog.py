@@ -1,10 +1,17 @@
 #! /usr/bin/env python3
 #
 # Extract the iformation from the SFMC dialog
-#  - position into a CSV
+#  - position into a CSV, optionally partitioned, see PositionWriter
 #  - position+sensors into a NetCDF
 #  - uploaded [st][bc]d files
 #
+# With --checkpointInterval, the parser's state, the sensors, and a high-water
+# mark of the dialog processed, the last Curr Time: and the number of lines
+# since it, are saved periodically. After a restart the state is restored and
+# dialog up to the high-water mark, which SFMC sends again, is skipped.
+# On a clean shutdown the parser's own thread stops, writes its buffered
+# positions, and queues a final checkpoint behind the pending sensor updates.
+#
 # This is a rewrite of my existing code for handling SFMC's API
 #
 # Nov-2024, Pat Welch, pat@mousebrains.com
@@ -12,6 +19,8 @@
 from argparse import ArgumentParser
 import logging
 import queue
+import threading
+import atexit
 import os
 import re
 import math
@@ -20,17 +29,36 @@ from datetime import datetime, timezone, timedelta
 from TPWUtils.Thread import Thread
 from DownloadFiles import DownloadFiles
 from Sensors import Sensors
+from Stats import counters
+from PolicyQueue import PolicyQueue
+from PositionWriter import PositionWriter
+import State
+
+_fixListeners = [] # func(glider, t, lat, lon) called for each fix written
+
+def addFixListener(func) -> None:
+    ''' Call func(glider, t, lat, lon) for every fix written, from the parser's thread '''
+    _fixListeners.append(func)
+
+def notifyFix(glider:str, t:float, lat:float, lon:float) -> None:
+    for func in _fixListeners: func(glider, t, lat, lon)
+
+def mkPositionWriter(glider:str, args:ArgumentParser) -> PositionWriter:
+    return PositionWriter(args.csvDir, glider, args.csvPartition,
+            args.csvFlushCount, args.csvFlushInterval,
+            latest=args.csvLatest, deploymentGap=args.csvDeploymentGap * 86400)
 
 class ParseDialog(Thread):
     def __init__(self, glider:str, args:ArgumentParser, sendTo:list, 
             sensors:Sensors, download:DownloadFiles,
+            writer:PositionWriter=None,
             ) -> None:
         Thread.__init__(self, "PD:" + glider, args)
         self.__gliderName = glider
         self.__sendTo = sendTo
         self.__sensors = sensors
         self.__download = download
-        self.__queue = queue.Queue()
+        self.__queue = PolicyQueue(glider, "dialog", args.dialogQueue, args.dialogPolicy)
         self.__location = re.compile(
                 b"^GPS Location:\s+([+-]?\d+[.]\d+)\s+[NS]\s+([+-]?\d+[.]\d+)\s+[EW]\s+measured\s+(\d+[.]\d+)\s+secs")
         self.__time = re.compile(
@@ -39,12 +67,49 @@ class ParseDialog(Thread):
                 b"^\s+sensor:(\w+)[(]([/\-%\w]+)[)]=(-?\d+[.]{0,1}\d*)\s+(\d+[.]\d*|\d+e[+-]?\d+) secs ago")
         self.__devices = re.compile(b"^devices:")
         self.__zmodem = re.compile(b"^zModem\s+transfer\s+DONE\s+for\s+file")
+        self.__writer = writer if writer is not None else mkPositionWriter(glider, args)
+        self.__t = None # Most recent glider time
+        self.__prevTime = None # Time of the most recent position written
+        self.__nSince = 0 # Lines processed since the last Curr Time: line
+        self.__resume = None # [t, nSince, n, qSeen] high-water mark while skipping processed dialog
+        self.__qCheckpoint = State.checkpointing(args)
+        self.__tCheckpoint = None # When the next checkpoint is due, None if nothing is new
+        self.__stopping = None # Event set once the thread has finished, when closing
+        self.__qClosed = False
+        self.__counts = counters(glider)
+        # The prefixes are mutually exclusive, so the first byte of a line picks
+        # the only pattern which can match it. Lines with other first bytes are noise.
+        self.__dispatch = {}
+        for (prefix, key, regex, handler) in (
+                (b"G", "location", self.__location, self.__onLocation),
+                (b"C", "time", self.__time, self.__onTime),
+                (b" \t\n\r\f\v", "sensor", self.__sensor, self.__onSensor),
+                (b"d", "devices", self.__devices, self.__onDevices),
+                (b"z", "zModem", self.__zmodem, self.__onZmodem),
+                ):
+            for c in prefix:
+                self.__dispatch[c] = (regex.match, handler, key)
+        # Before any reader starts, so it knows what to skip
+        if self.__qCheckpoint: self.__restore()
+        # After the sensors registered theirs, so the final checkpoint goes through them
+        atexit.register(self.close) # Write buffered positions on a clean shutdown
 
     @staticmethod
     def addArgs(parser:ArgumentParser) -> ArgumentParser:
         grp = parser.add_argument_group(description="Dialog Parser")
         grp.add_argument("--csvDir", type=str, default="./CSV", 
                 help="Where to write position CSV to")
+        grp.add_argument("--csvPartition", type=str, default="none",
+                choices=("none", "daily", "deployment"),
+                help="Also write positions to per day or per deployment CSVs, and only send those")
+        grp.add_argument("--csvDeploymentGap", type=float, default=7,
+                help="Days without a position which start a new deployment CSV")
+        grp.add_argument("--csvLatest", type=int, default=0,
+                help="Number of positions to keep in glider.latest.csv, 0 disables it")
+        grp.add_argument("--csvFlushCount", type=int, default=1,
+                help="Number of positions to buffer before writing them")
+        grp.add_argument("--csvFlushInterval", type=float, default=0,
+                help="Maximum seconds to buffer positions before writing them, 0 only by count")
 
     def put(self, line:bytes) -> None:
         self.__queue.put(line)
@@ -58,7 +123,109 @@ class ParseDialog(Thread):
         minutes = degmin % 100
         return qNeg * (deg + minutes / 60)
 
-    def __matchedLocation(self, matches, time:datetime, prevTime:datetime, ofn:str) -> datetime:
+    def __send(self, filenames:list) -> None:
+        if self.__sendTo:
+            for fn in filenames:
+                for tgt in self.__sendTo:
+                    tgt.put(fn)
+
+    def flush(self) -> None:
+        self.__send(self.__writer.flush())
+
+    def timeout(self) -> float:
+        ''' Seconds until buffered positions or a checkpoint are due, None if neither is pending '''
+        dt = self.__writer.timeout()
+        if self.__tCheckpoint is not None:
+            dtc = max(0, self.__tCheckpoint - time.time())
+            dt = dtc if dt is None else min(dt, dtc)
+        return dt
+
+    def due(self) -> None:
+        ''' Flush buffered positions and checkpoint if they are due '''
+        if self.__writer.timeout() == 0: self.flush()
+        if self.__tCheckpoint is not None and time.time() >= self.__tCheckpoint: self.checkpoint()
+
+    @property
+    def checkpointing(self) -> bool:
+        return self.__qCheckpoint
+
+    def __state(self) -> dict:
+        return dict(
+                t=None if self.__t is None else self.__t.timestamp(),
+                prevTime=None if self.__prevTime is None else self.__prevTime.timestamp(),
+                nSince=self.__nSince,
+                )
+
+    def __restore(self) -> None:
+        state = State.load(self.args, self.__gliderName + ".parser")
+        if not state: return
+        info = state["parser"]
+        if info["t"] is not None:
+            self.__t = datetime.fromtimestamp(info["t"], tz=timezone.utc)
+            self.__resume = [info["t"], info["nSince"], None, False]
+        if info["prevTime"] is not None:
+            self.__prevTime = datetime.fromtimestamp(info["prevTime"], tz=timezone.utc)
+        self.__nSince = info["nSince"]
+        logging.info("Resuming after %s plus %s lines, prevTime %s",
+                self.__t, self.__nSince, self.__prevTime)
+
+    def checkpoint(self) -> None:
+        ''' Save the state, through the sensors so they have caught up to it '''
+        self.flush() # Positions up to the high-water mark are on disk
+        self.__sensors.checkpoint(self.__state())
+        self.__tCheckpoint = None
+
+    def skip(self, line:bytes) -> bool:
+        ''' True for dialog processed before a restart, called by the dialog reader '''
+        resume = self.__resume # [t, nSince, lines since t's Curr Time:, seen an old Curr Time:]
+        if resume is None: return False
+        matches = self.__time.match(line)
+        if matches:
+            t = self.__mkTime(matches).timestamp()
+            if t > resume[0]: # Past the high-water mark
+                self.__resume = None
+                logging.info("Caught up, skipped %s lines", self.__counts["resumeSkipped"])
+                return False
+            resume[2] = 0 if t == resume[0] else None
+            resume[3] = True
+        elif not resume[3]: # SFMC has not sent old dialog, at least not yet
+            return False
+        elif resume[2] is not None: # Lines following the high-water mark's Curr Time:
+            resume[2] += 1
+            if resume[2] > resume[1]:
+                self.__resume = None
+                logging.info("Caught up, skipped %s lines", self.__counts["resumeSkipped"])
+                return False
+        self.__counts["resumeSkipped"] += 1
+        return True
+
+    def finish(self, done:threading.Event=None) -> None:
+        ''' From the parser's thread, write buffered positions and queue a final checkpoint '''
+        if not self.__qClosed:
+            self.__qClosed = True
+            self.__send(self.__writer.close())
+            if self.__tCheckpoint is not None: # Save what is new since the last checkpoint
+                self.__tCheckpoint = None
+                self.__sensors.checkpoint(self.__state(), done) # Sets done once saved
+                return
+        if done is not None: done.set()
+
+    def close(self) -> None:
+        ''' Write buffered positions and a final checkpoint, called at exit '''
+        if not self.is_alive() or threading.current_thread() is self:
+            self.finish()
+            return
+        # The parser's thread owns the writers, so it stops and finishes up
+        done = threading.Event()
+        self.__stopping = done
+        try:
+            self.__queue.put(None, timeout=1) # Wake it up
+        except queue.Full: # Busy, so it sees __stopping after this line
+            pass
+        if not done.wait(10):
+            logging.warning("Timed out waiting for %s to finish", self.name)
+
+    def __matchedLocation(self, matches, time:datetime, prevTime:datetime) -> datetime:
         lat = self.__mkDegrees(matches[1])
         lon = self.__mkDegrees(matches[2])
         dt = float(str(matches[3], "utf-8"))
@@ -66,15 +233,10 @@ class ParseDialog(Thread):
         if not time: return prevTime
         t = time - timedelta(seconds=dt)
         if prevTime is not None and (abs(t - prevTime) <= timedelta(seconds=60)): return prevTime
-        with open(ofn, "a") as fp:
-            if fp.tell() == 0:
-                fp.write("time,lat,lon\n")
-            fp.write(f"{time.timestamp():.0f},{lat:.7f},{lon:.7f}\n")
-
-        if self.__sendTo:
-            for tgt in self.__sendTo:
-                tgt.put(ofn)
-
+        t = time.timestamp()
+        self.__send(self.__writer.append(t, lat, lon))
+        self.__counts["fixes"] += 1
+        if _fixListeners: notifyFix(self.__gliderName, t, lat, lon)
         return time
 
     def __mkSensor(self, name:bytes, units:bytes, val:bytes, dt:bytes, time:datetime,) -> None:
@@ -88,66 +250,78 @@ class ParseDialog(Thread):
                 (time - timedelta(seconds=dt)).timestamp(),
                 )
 
-    def runIt(self): # Called on start
-        ofn = os.path.join(self.args.csvDir, self.__gliderName + ".csv")
-        logging.info("Starting %s", ofn)
+    def __onLocation(self, matches) -> None:
+        self.__prevTime = self.__matchedLocation(matches, self.__t, self.__prevTime)
+        logging.debug("prevTime %s", self.__prevTime)
 
-        if not os.path.isdir(self.args.csvDir):
-            logging.info("Creating %s", self.args.csvDir)
-            os.makedirs(self.args.csvDir, mode=0o755, exist_ok=True)
+    @staticmethod
+    def __mkTime(matches) -> datetime:
+        return datetime.strptime(
+                str(matches[1], "utf-8"),
+                "%b %d %H:%M:%S %Y",
+                ).replace(tzinfo=timezone.utc)
 
-        q = self.__queue
+    def __onTime(self, matches) -> None:
+        self.__t = self.__mkTime(matches)
+        self.__nSince = 0
+        logging.debug("time %s", self.__t)
 
-        reLoci = self.__location
-        reTime = self.__time
-        reSensor = self.__sensor
-        reDevices= self.__devices
-        reZmodem = self.__zmodem
+    def __onSensor(self, matches) -> None:
+        t = self.__t
+        if not t: return
+        logging.debug("sensor %s %s %s %s t %s", matches[1], matches[2], matches[3], matches[4], t)
+        self.__mkSensor(matches[1], matches[2], matches[3], matches[4], t,)
 
-        t = None
-        prevTime = None
-        sensors = dict()
+    def __onDevices(self, matches) -> None:
+        self.__sensors.devices()
 
-        while True:
-            line = q.get()
-            logging.info("Line %s", line)
-            q.task_done()
-            matches = reLoci.match(line)
-            if matches:
-                prevTime = self.__matchedLocation(matches, t, prevTime, ofn)
-                logging.info("prevTime %s", prevTime)
-                continue
+    def __onZmodem(self, matches) -> None:
+        logging.info("ZModem")
+        self.__download.put()
 
-            matches = reTime.match(line)
-            if matches:
-                t = datetime.strptime(
-                        str(matches[1], "utf-8"),
-                        "%b %d %H:%M:%S %Y",
-                        ).replace(tzinfo=timezone.utc)
-                logging.info("time %s", t)
-                continue
+    def process(self, line:bytes) -> None:
+        ''' Classify a dialog line in a single pass and route it to its handler '''
+        if not line: return
+        self.__nSince += 1
+        if self.__tCheckpoint is None and self.__qCheckpoint:
+            self.__tCheckpoint = time.time() + self.args.checkpointInterval
+        entry = self.__dispatch.get(line[0])
+        if entry is None: return
+        matches = entry[0](line)
+        if matches:
+            self.__counts[entry[2]] += 1
+            entry[1](matches)
 
-            matches = reSensor.match(line)
-            logging.info("SENSORS line %s\nmatches %s", line, matches)
-            if matches and t: 
-                logging.info("sensor %s %s %s %s t %s", matches[1], matches[2], matches[3], matches[4], t)
-                self.__mkSensor(matches[1], matches[2], matches[3], matches[4], t,)
-                continue
+    def prepare(self) -> None:
+        ''' Create the output directory '''
+        logging.info("Starting %s", self.__writer.filename)
 
-            matches = reDevices.match(line)
-            logging.info("DEVICES line %s\nmatches %s", line, matches)
-            if matches:
-                self.__sensors.devices()
-                continue
+        if not os.path.isdir(self.args.csvDir):
+            logging.info("Creating %s", self.args.csvDir)
+            os.makedirs(self.args.csvDir, mode=0o755, exist_ok=True)
 
-            if reZmodem.match(line):
-                logging.info("ZModem")
-                self.__download.put()
+    def runIt(self): # Called on start
+        self.prepare()
+
+        q = self.__queue
+        process = self.process
+
+        while self.__stopping is None:
+            try:
+                line = q.get(timeout=self.timeout())
+            except queue.Empty:
+                self.due()
                 continue
+            q.task_done()
+            if self.__stopping is not None: break # Past the final high-water mark
+            process(line)
+            if self.__qCheckpoint: self.due() # A steady stream never times out
+        self.finish(self.__stopping)
 
 if __name__ == "__main__":
     from TPWUtils import Logger
     from SendTo import SendToTarget
+    from NodeWorker import NodeWorker
 
     parser = ArgumentParser()
     parser.add_argument("dialog", type=str, nargs="+", help="Dialog log file(s) to parse")
@@ -157,8 +331,11 @@ if __name__ == "__main__":
     Logger.addArgs(parser)
     SendToTarget.addArgs(parser)
     Sensors.addArgs(parser)
+    State.addArgs(parser)
     DownloadFiles.addArgs(parser)
+    NodeWorker.addArgs(parser)
     ParseDialog.addArgs(parser)
+    PolicyQueue.addArgs(parser)
     args = parser.parse_args()
 
     Logger.mkLogger(args, logLevel=logging.INFO)
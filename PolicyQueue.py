@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+#
+# Bounded queues with an explicit policy for when they fill up
+#
+#  block      put waits for room, which pushes back on the producer
+#  dropOldest put discards the oldest item to make room
+#  latest     an item replaces the pending item with the same key, in place.
+#             Items whose key is None are barriers, items are never
+#             coalesced across a barrier. put waits for room for new keys.
+#  merge      an item equal to a pending item is dropped, put waits for room
+#             for new items
+#
+# Blocking, dropping, and coalescing are counted in the Stats counters of the
+# queue's owner, and a warning is logged when a queue starts pushing back.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from collections import deque
+import logging
+import queue
+import time
+from Stats import counters, gauge
+
+POLICIES = ("block", "dropOldest", "latest", "merge")
+
+class PolicyQueue(queue.Queue):
+    def __init__(self, owner:str, label:str, maxsize:int=0, policy:str="block",
+            key=None) -> None:
+        if policy not in POLICIES: raise ValueError(f"Unknown queue policy {policy}")
+        if policy == "latest" and key is None: raise ValueError("latest policy needs a key")
+        self.owner = owner
+        self.label = label
+        self.policy = policy
+        self.__key = (lambda item: (item,)) if policy == "merge" else key
+        self.__counts = counters(owner)
+        self.__tWarned = 0
+        queue.Queue.__init__(self, maxsize)
+        gauge(owner, label + "Queue", lambda: len(self.queue)) # No lock needed for a length
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Queue bounds, 0 is unbounded")
+        grp.add_argument("--dialogQueue", type=int, default=100000,
+                help="Dialog lines waiting to be parsed per glider")
+        grp.add_argument("--dialogPolicy", type=str, default="block",
+                choices=("block", "dropOldest"),
+                help="What to do with dialog lines when the parser falls behind")
+        grp.add_argument("--sensorQueue", type=int, default=10000,
+                help="Sensor updates waiting per glider, only the latest value of each is kept")
+        grp.add_argument("--sendQueue", type=int, default=10000,
+                help="Distinct paths waiting per target and lane, duplicates are merged")
+        return parser
+
+    # Storage, entries are [item] so a coalesced item can be replaced in place
+    def _init(self, maxsize:int) -> None:
+        self.queue = deque()
+        self.__pending = {} # key -> entry, since the last barrier
+
+    def _qsize(self) -> int:
+        return len(self.queue)
+
+    def _put(self, item) -> None:
+        entry = [item]
+        self.queue.append(entry)
+        if self.__key is None: return
+        k = self.__key(item)
+        if k is None: # Barrier
+            self.__pending.clear()
+        else:
+            self.__pending[k] = entry
+
+    def _get(self):
+        entry = self.queue.popleft()
+        if self.__key is not None:
+            k = self.__key(entry[0])
+            if k is not None and self.__pending.get(k) is entry: del self.__pending[k]
+        return entry[0]
+
+    def __coalesce(self, item) -> bool:
+        ''' Fold item into a pending one, returns True if it was '''
+        if self.__key is None: return False
+        k = self.__key(item)
+        if k is None: return False
+        entry = self.__pending.get(k)
+        if entry is None: return False
+        if self.policy == "latest": entry[0] = item
+        self.__counts[self.label + "Coalesced"] += 1
+        return True
+
+    def __warn(self, what:str) -> None:
+        now = time.time()
+        if now - self.__tWarned < 60: return
+        self.__tWarned = now
+        logging.warning("%s %s queue is full, %s, %s items", self.owner, self.label, what,
+                self._qsize())
+
+    def put(self, item, block:bool=True, timeout:float=None) -> None:
+        with self.not_full:
+            if self.__coalesce(item): return
+            if self.maxsize > 0 and self._qsize() >= self.maxsize:
+                if self.policy == "dropOldest":
+                    self.__warn("dropping the oldest")
+                    self._get()
+                    self.unfinished_tasks -= 1
+                    self.__counts[self.label + "Dropped"] += 1
+                else:
+                    if not block: raise queue.Full
+                    self.__counts[self.label + "Blocked"] += 1
+                    self.__warn("applying backpressure")
+                    tEnd = None if timeout is None else time.monotonic() + timeout
+                    while self._qsize() >= self.maxsize:
+                        if tEnd is None:
+                            self.not_full.wait()
+                        else:
+                            dt = tEnd - time.monotonic()
+                            if dt <= 0: raise queue.Full
+                            self.not_full.wait(dt)
+                        if self.__coalesce(item): return
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
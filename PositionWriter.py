@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+#
+# Buffer glider positions and append them to time,lat,lon CSV files in batches
+#
+# The full history, glider.csv, is always written. Its handle is kept open
+# between batches. Optionally positions are also written to
+#   glider.YYYYmmdd.csv          one file per UTC day, partition="daily"
+#   glider.YYYYmmddTHHMMSS.csv   one file per deployment, named by its first
+#                                position, partition="deployment". A new
+#                                deployment starts after a gap of deploymentGap
+#   glider.latest.csv            the most recent latest positions
+# When partitioned, only the partition and latest files are returned to be
+# sent, so each transfer stays small rather than growing with the deployment.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import logging
+import glob
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+HEADER = "time,lat,lon\n"
+
+def tailRows(fn:str, n:int) -> list:
+    ''' The last n rows of a CSV, without its header '''
+    if n <= 0 or not os.path.isfile(fn): return []
+    with open(fn, "rb") as fp:
+        size = fp.seek(0, os.SEEK_END)
+        nBytes = 64 * (n + 1)
+        while True:
+            offset = max(0, size - nBytes)
+            fp.seek(offset)
+            lines = fp.read().splitlines(keepends=True)
+            if offset == 0 or len(lines) > n: break
+            nBytes *= 2
+    if offset: lines = lines[1:] # Partial line
+    rows = [str(line, "utf-8") for line in lines if line[:1].isdigit()]
+    return rows[-n:]
+
+class PositionWriter:
+    def __init__(self, directory:str, glider:str, partition:str="none",
+            flushCount:int=1, flushInterval:float=0,
+            latest:int=0, deploymentGap:float=7 * 86400) -> None:
+        self.__dir = directory
+        self.__glider = glider
+        self.__partition = partition
+        self.__flushCount = max(1, flushCount)
+        self.__flushInterval = flushInterval
+        self.__deploymentGap = deploymentGap
+        self.__ofn = os.path.join(directory, glider + ".csv")
+        self.__latestFn = os.path.join(directory, glider + ".latest.csv") if latest > 0 else None
+        self.__latest = None # Most recent rows, loaded from the full file on the first flush
+        self.__nLatest = latest
+        self.__files = {} # filename -> open handle
+        self.__current = None # Current partition's filename
+        self.__tLast = None # Time of the last row in the current deployment
+        self.__rows = [] # (time, row)
+        self.__tFirst = None # When the oldest buffered row was appended
+
+    @property
+    def filename(self) -> str:
+        return self.__ofn
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    @staticmethod
+    def outputs(directory:str, glider:str) -> list:
+        ''' Existing files written for glider '''
+        fn = os.path.join(directory, glider + ".csv")
+        items = glob.glob(os.path.join(glob.escape(directory), glob.escape(glider) + ".*.csv"))
+        return ([fn] if os.path.isfile(fn) else []) + sorted(items)
+
+    def timeout(self) -> float:
+        ''' Seconds until buffered rows need to be flushed, None if nothing is buffered '''
+        if self.__tFirst is None or self.__flushInterval <= 0: return None
+        return max(0, self.__tFirst + self.__flushInterval - time.time())
+
+    def append(self, t:float, lat:float, lon:float) -> list:
+        ''' Buffer a position, returns the files to send if flushed '''
+        if not self.__rows: self.__tFirst = time.time()
+        self.__rows.append((t, f"{t:.0f},{lat:.7f},{lon:.7f}\n"))
+        if len(self.__rows) >= self.__flushCount or self.timeout() == 0:
+            return self.flush()
+        return []
+
+    def __open(self, fn:str):
+        fp = self.__files.get(fn)
+        if fp is None:
+            fp = open(fn, "a")
+            if fp.tell() == 0: fp.write(HEADER)
+            self.__files[fn] = fp
+        return fp
+
+    def __close(self, fn:str) -> None:
+        fp = self.__files.pop(fn, None)
+        if fp is not None: fp.close()
+
+    def __lastDeployment(self) -> None:
+        ''' Pick up the most recent deployment file from before a restart '''
+        pattern = re.compile(re.escape(self.__glider) + r"[.]\d{8}T\d{6}[.]csv")
+        names = [os.path.basename(fn) for fn in self.outputs(self.__dir, self.__glider)]
+        names = sorted(name for name in names if pattern.fullmatch(name))
+        if not names: return
+        fn = os.path.join(self.__dir, names[-1])
+        rows = tailRows(fn, 1)
+        if rows:
+            self.__current = fn
+            self.__tLast = float(rows[0].split(",", 1)[0])
+
+    def __partitionFor(self, t:float) -> str:
+        ''' Filename of the partition t belongs in, rolling over as needed '''
+        if self.__partition == "daily":
+            stamp = datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y%m%d")
+            fn = os.path.join(self.__dir, f"{self.__glider}.{stamp}.csv")
+        else:
+            if self.__current is None and self.__tLast is None: self.__lastDeployment()
+            fn = self.__current
+            if fn is None or abs(t - self.__tLast) > self.__deploymentGap:
+                stamp = datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+                fn = os.path.join(self.__dir, f"{self.__glider}.{stamp}.csv")
+            self.__tLast = t
+        if fn != self.__current:
+            if self.__current is not None:
+                logging.info("Rolling over from %s to %s", self.__current, fn)
+                self.__close(self.__current)
+            self.__current = fn
+        return fn
+
+    def __writeLatest(self, rows:list) -> None:
+        if self.__latest is None: # Carry the latest rows over from before a restart
+            self.__latest = deque(tailRows(self.__ofn, self.__nLatest), maxlen=self.__nLatest)
+        else:
+            self.__latest.extend(rows)
+        fn = self.__latestFn
+        tfn = fn + ".tmp"
+        with open(tfn, "w") as fp:
+            fp.write(HEADER)
+            fp.writelines(self.__latest)
+        os.replace(tfn, fn) # Readers never see a partial file
+
+    def flush(self) -> list:
+        ''' Write all buffered rows, returns the files to send '''
+        rows = self.__rows
+        if not rows: return []
+        fp = self.__open(self.__ofn)
+        fp.writelines(row for (t, row) in rows)
+        fp.flush()
+        toSend = []
+        if self.__partition == "none":
+            toSend.append(self.__ofn)
+        else:
+            for (t, row) in rows:
+                fn = self.__partitionFor(t)
+                self.__open(fn).write(row)
+                if fn not in toSend: toSend.append(fn)
+            for fn in toSend:
+                if fn in self.__files: self.__files[fn].flush()
+        if self.__latestFn:
+            self.__writeLatest([row for (t, row) in rows])
+            toSend.append(self.__latestFn)
+        logging.debug("Flushed %s rows to %s", len(rows), toSend)
+        self.__rows = []
+        self.__tFirst = None
+        return toSend
+
+    def close(self) -> list:
+        ''' Write buffered rows and close the files, returns the files to send '''
+        toSend = self.flush()
+        for fn in list(self.__files):
+            self.__close(fn)
+        return toSend
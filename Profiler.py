@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+#
+# Profile a running harvester, grouped by thread name, PD:glider, SN:glider,
+# DN:glider, rsync targets, ...
+#
+# While enabled, every --profileSample seconds the stacks of all threads are
+# sampled from sys._current_frames, and tracemalloc traces allocations.
+# Each dump writes, to --profileDir,
+#   profile.pid.time.txt        CPU seconds per thread from /proc, the
+#                               hottest stacks per thread, and the top allocations
+#   profile.pid.time.folded     thread;frame;frame... count, for flame graphs
+#   profile.pid.time.tracemalloc  a tracemalloc snapshot
+# and restarts the collection.
+#
+# Dumps happen every --profileInterval seconds while enabled, on SIGUSR1, and
+# when profiling is turned off. SIGUSR2 turns profiling on and off without
+# a restart. Sampling costs nothing while profiling is off.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime, timezone
+import tracemalloc
+import threading
+import logging
+import signal
+import time
+import sys
+import os
+from TPWUtils.Thread import Thread
+
+class Profiler(Thread):
+    def __init__(self, args:ArgumentParser) -> None:
+        Thread.__init__(self, "Profiler", args)
+        self.__enabled = threading.Event()
+        if args.profile: self.__enabled.set()
+        self.__dumpNow = threading.Event()
+        self.__qRunning = False
+        self.__stacks = {} # thread name -> Counter of stacks
+        self.__nSamples = 0
+        self.__cpu0 = {} # thread native id -> (name, CPU seconds) at the start
+        self.__t0 = None
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Profiling options")
+        grp.add_argument("--profile", action="store_true",
+                help="Start with profiling enabled, SIGUSR2 toggles it at runtime")
+        grp.add_argument("--profileDir", type=str, default="./profile",
+                help="Where to write profiles")
+        grp.add_argument("--profileInterval", type=float, default=600,
+                help="Seconds between profile dumps while enabled, <=0 only dumps on SIGUSR1")
+        grp.add_argument("--profileSample", type=float, default=0.05,
+                help="Seconds between stack samples")
+        grp.add_argument("--profileFrames", type=int, default=1,
+                help="Frames tracemalloc keeps per allocation, 0 disables tracemalloc")
+        grp.add_argument("--profileTop", type=int, default=25,
+                help="Number of stacks and allocations to list per section")
+        return parser
+
+    def installSignals(self, forward=None) -> None:
+        ''' SIGUSR1 dumps and SIGUSR2 toggles, forward(signum) passes them on, main thread only '''
+        def handler(signum, frame) -> None:
+            if signum == signal.SIGUSR1:
+                self.dump()
+            else:
+                self.toggle()
+            if forward: forward(signum)
+        signal.signal(signal.SIGUSR1, handler)
+        signal.signal(signal.SIGUSR2, handler)
+
+    def dump(self) -> None:
+        self.__dumpNow.set()
+
+    def toggle(self) -> None:
+        if self.__enabled.is_set():
+            self.__enabled.clear()
+        else:
+            self.__enabled.set()
+
+    @staticmethod
+    def __cpuTimes() -> dict:
+        ''' thread native id -> (name, user+system CPU seconds), from /proc '''
+        names = {t.native_id: t.name for t in threading.enumerate()}
+        tick = os.sysconf("SC_CLK_TCK")
+        times = {}
+        for ident in names:
+            try:
+                with open(f"/proc/self/task/{ident}/stat", "r") as fp:
+                    fields = fp.read().rsplit(")", 1)[1].split()
+                times[ident] = (names[ident], (int(fields[11]) + int(fields[12])) / tick)
+            except (OSError, IndexError, ValueError): # Thread exited or no /proc
+                pass
+        return times
+
+    def __start(self) -> None:
+        logging.info("Profiling enabled")
+        self.__stacks = {}
+        self.__nSamples = 0
+        self.__cpu0 = self.__cpuTimes()
+        self.__t0 = time.time()
+        if self.args.profileFrames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.args.profileFrames)
+        self.__qRunning = True
+
+    def __stop(self) -> None:
+        self.__write()
+        if tracemalloc.is_tracing(): tracemalloc.stop()
+        self.__qRunning = False
+        logging.info("Profiling disabled")
+
+    def __sample(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        me = threading.get_ident()
+        for (ident, frame) in sys._current_frames().items():
+            if ident == me: continue
+            stack = [f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{frame.f_lineno}"]
+            frame = frame.f_back
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            name = names.get(ident, str(ident))
+            if name not in self.__stacks: self.__stacks[name] = Counter()
+            self.__stacks[name][";".join(reversed(stack))] += 1
+        self.__nSamples += 1
+
+    def __write(self) -> None:
+        ''' Write what has been collected and start collecting again '''
+        args = self.args
+        os.makedirs(args.profileDir, mode=0o755, exist_ok=True)
+        now = time.time()
+        stamp = datetime.fromtimestamp(now, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+        base = os.path.join(args.profileDir, f"profile.{os.getpid()}.{stamp}")
+
+        cpu1 = self.__cpuTimes()
+        cpu = Counter()
+        for ident in cpu1:
+            (name, t) = cpu1[ident]
+            cpu[name] += t - self.__cpu0.get(ident, (name, 0))[1]
+
+        stacks = self.__stacks
+        with open(base + ".txt", "w") as fp:
+            fp.write(f"Profile of pid {os.getpid()} for {now - self.__t0:.1f} seconds, ")
+            fp.write(f"{self.__nSamples} samples every {args.profileSample} seconds\n")
+            fp.write("\nCPU seconds by thread\n")
+            for (name, t) in cpu.most_common():
+                fp.write(f"{t:10.2f} {name}\n")
+            for name in sorted(stacks, key=lambda x: -cpu.get(x, 0)):
+                fp.write(f"\nStacks for {name}, {sum(stacks[name].values())} samples\n")
+                for (stack, cnt) in stacks[name].most_common(args.profileTop):
+                    fp.write(f"{cnt:8d} {stack}\n")
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, __file__), # Not our own bookkeeping
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    ))
+                snapshot.dump(base + ".tracemalloc")
+                (current, peak) = tracemalloc.get_traced_memory()
+                fp.write(f"\nTraced memory {current} bytes, peak {peak} bytes\n")
+                for stat in snapshot.statistics("lineno")[:args.profileTop]:
+                    fp.write(f"{stat}\n")
+
+        with open(base + ".folded", "w") as fp:
+            for name in stacks:
+                for (stack, cnt) in stacks[name].items():
+                    fp.write(f"{name};{stack} {cnt}\n")
+
+        logging.info("Wrote %s", base)
+        self.__stacks = {}
+        self.__nSamples = 0
+        self.__cpu0 = cpu1
+        self.__t0 = now
+
+    def runIt(self): # Called on start
+        args = self.args
+        tNext = None
+        while True:
+            if self.__enabled.is_set():
+                if not self.__qRunning:
+                    self.__start()
+                    tNext = time.time() + args.profileInterval
+                self.__sample()
+                time.sleep(args.profileSample)
+                if self.__dumpNow.is_set() or \
+                        (args.profileInterval > 0 and time.time() >= tNext):
+                    self.__dumpNow.clear()
+                    self.__write()
+                    tNext = time.time() + args.profileInterval
+            else:
+                if self.__qRunning: self.__stop()
+                if self.__dumpNow.is_set():
+                    self.__dumpNow.clear()
+                    logging.info("Profiling is disabled, SIGUSR2 enables it")
+                self.__enabled.wait(1)
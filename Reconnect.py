@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+#
+# Reconnecting to a glider's dialog stream
+#
+# backoff gives a jittered exponential delay before each reconnect, so many
+# gliders dropping at once do not all hammer SFMC together.
+#
+# When the stream is reconnected, the API may send recent dialog again.
+# ReplayFilter keeps a rolling window of fingerprints of the last lines
+# received. After a reconnect, lines which follow on from a run of lines in
+# the window are held back. Once a run of at least two lines, or a Curr Time:
+# line, reaches the end of the window, the held lines were a replay and are
+# dropped. The first line which does not
+# follow on ends the resync and releases anything still held. Lines repeat
+# in normal dialog, so outside a resync nothing is held or dropped.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from collections import deque
+import logging
+import random
+from Stats import counters
+
+def backoff(delay:float, maxDelay:float, attempt:int) -> float:
+    ''' Seconds to wait before reconnect attempt, counting from 1, between half and all of the doubled delay '''
+    dt = min(maxDelay, delay * 2 ** max(0, attempt - 1))
+    return random.uniform(dt / 2, dt)
+
+class ReplayFilter:
+    START = () # Resyncing, but no line has been compared yet
+
+    def __init__(self, glider:str, size:int) -> None:
+        self.__window = deque(maxlen=size) # Fingerprints of the most recent lines
+        self.__replay = None # Snapshot of the window while resyncing
+        self.__candidates = None # Window positions the replay may be at, None when not resyncing
+        self.__held = [] # Lines which may be a replay
+        self.__run = 0 # Lines matched since the reconnect
+        self.__counts = counters(glider)
+
+    def reconnected(self) -> list:
+        ''' The stream was reconnected, returns held lines to process '''
+        lines = self.__release()
+        if self.__window:
+            self.__replay = list(self.__window) # Positions do not shift while resyncing
+            self.__candidates = self.START
+        return lines
+
+    def filter(self, line:bytes) -> list:
+        ''' The lines to process now, which are not a replay '''
+        fp = hash(line) # Stable within the process, which is all the window needs
+        candidates = self.__candidates
+        if candidates is None:
+            self.__window.append(fp)
+            return [line]
+
+        replay = self.__replay
+        if candidates is self.START:
+            candidates = [i for (i, item) in enumerate(replay) if item == fp]
+            self.__run = 0
+        else:
+            candidates = [i + 1 for i in candidates if replay[i + 1] == fp]
+        self.__held.append(line)
+        self.__run += 1
+        if not candidates: return self.__release()
+
+        if candidates[-1] != len(replay) - 1:
+            pass # Not at the end of the window yet
+        elif self.__run < 2 and not line.startswith(b"Curr Time:"):
+            # One common line, such as a blank one, equal to the last line
+            # received is not enough to call it a replay
+            candidates.pop()
+            if not candidates: return self.__release()
+        else:
+            # The held lines repeat the end of the window, so they were replayed.
+            # Common lines, such as blank ones, also match in the middle, so keep
+            # following any longer run.
+            counts = self.__counts
+            counts["dedupedLines"] += len(self.__held)
+            counts["dedupedBytes"] += sum(len(item) for item in self.__held)
+            self.__held = []
+            candidates.pop()
+            if not candidates:
+                self.__release()
+                return []
+        self.__candidates = candidates
+        return []
+
+    def __release(self) -> list:
+        ''' End the resync, returns the held lines which were not a replay '''
+        if self.__candidates is not None:
+            logging.info("Resynchronized, %s duplicate lines dropped so far",
+                    self.__counts["dedupedLines"])
+        lines = self.__held
+        self.__held = []
+        self.__candidates = None
+        self.__replay = None
+        self.__window.extend(hash(line) for line in lines)
+        return lines
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+#
+# Shared scheduler for SFMC API calls from every glider
+#
+# Calls are admitted by a global token bucket and a concurrency cap.
+# Gliders with waiting calls take turns, round robin, so one glider with
+# many pages to list does not starve the others. With shards, each shard has
+# its own scheduler and a share of the rate, and the concurrency cap is a
+# semaphore shared by all of them. By default a burst allows one call per
+# glider, so gliders surfacing together are not held up, while the rate and
+# the concurrency cap protect SFMC.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import threading
+import time
+from collections import deque
+
+class Scheduler:
+    def __init__(self, args:ArgumentParser, slots=None, gliders:int=1) -> None:
+        self.__slots = slots # Semaphore shared between processes
+        self.__rate = args.sfmcRate # Calls per second, <=0 is unlimited
+        self.__burst = max(1, args.sfmcBurst if args.sfmcBurst > 0 else gliders)
+        self.__concurrency = max(1, args.sfmcConcurrency)
+        self.__tokens = self.__burst
+        self.__tRefill = time.monotonic()
+        self.__running = 0
+        self.__waiting = {} # glider -> deque of tickets
+        self.__ring = deque() # Gliders with waiting tickets, head has the turn
+        self.__cond = threading.Condition()
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="SFMC API scheduling options")
+        grp.add_argument("--sfmcRate", type=float, default=1,
+                help="Maximum SFMC API calls per second across all gliders, <=0 is unlimited")
+        grp.add_argument("--sfmcBurst", type=int, default=0,
+                help="Number of SFMC API calls allowed in a burst, <=0 is one per glider")
+        grp.add_argument("--sfmcConcurrency", type=int, default=3,
+                help="Maximum simultaneous SFMC API calls across all gliders")
+        return parser
+
+    def __takeToken(self) -> float:
+        ''' Take a token, returning 0, or return seconds until one is available '''
+        if self.__rate <= 0: return 0
+        now = time.monotonic()
+        self.__tokens = min(self.__burst,
+                self.__tokens + (now - self.__tRefill) * self.__rate)
+        self.__tRefill = now
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return 0
+        return (1 - self.__tokens) / self.__rate
+
+    def acquire(self, glider:str) -> None:
+        ticket = object()
+        with self.__cond:
+            tickets = self.__waiting.setdefault(glider, deque())
+            tickets.append(ticket)
+            if glider not in self.__ring: self.__ring.append(glider)
+            while True:
+                if self.__ring[0] == glider and tickets[0] is ticket \
+                        and self.__running < self.__concurrency:
+                    dt = self.__takeToken()
+                    if dt == 0: break
+                    self.__cond.wait(dt)
+                else:
+                    self.__cond.wait()
+            tickets.popleft()
+            self.__ring.popleft()
+            if tickets:
+                self.__ring.append(glider) # Back of the line for the next call
+            else:
+                del self.__waiting[glider]
+            self.__running += 1
+            self.__cond.notify_all()
+
+    def release(self) -> None:
+        with self.__cond:
+            self.__running -= 1
+            self.__cond.notify_all()
+
+    def run(self, glider:str, func, *args):
+        ''' Call func(*args) once glider has been given a slot '''
+        self.acquire(glider)
+        try:
+            if self.__slots is None: return func(*args)
+            with self.__slots:
+                return func(*args)
+        finally:
+            self.release()
@@ -2,6 +2,15 @@
 #
 # Sync a file up to a target machine via rsync
 #
+# Small files, positions and sensors, go through a priority lane ahead of bulk
+# directory syncs from DownloadFiles. Each target has a small pool of workers,
+# one of which only serves the priority lane, and remote targets share a
+# multiplexed ssh control connection. A path already waiting in a lane is
+# not queued again, and each lane holds at most --sendQueue paths, after
+# which put waits for room. A failed rsync is set aside until its backoff has
+# passed, so the worker goes on with other batches in the meantime. A path
+# waiting for a retry is not queued again, it goes with the retry.
+#
 # This is a rewrite of my existing code for handling SFMC's API
 #
 # Nov-2024, Pat Welch, pat@mousebrains.com
@@ -9,14 +18,49 @@
 from argparse import ArgumentParser
 import subprocess
 import logging
-import queue
+import threading
+import atexit
+import os
+import shlex
+import time
+from collections import deque, Counter
 from TPWUtils import Logger
 from TPWUtils.Thread import Thread
+from Stats import counters, gauge
+
+class SendWorker(Thread):
+    ''' Additional worker for a SendToTarget '''
+    def __init__(self, name:str, args:ArgumentParser, work, qBulk:bool) -> None:
+        Thread.__init__(self, name, args)
+        self.__work = work
+        self.__qBulk = qBulk
+
+    def runIt(self): # Called on start
+        self.__work(self.__qBulk)
 
 class SendToTarget(Thread):
+    PRIORITY = 0 # Lane for small files
+    BULK = 1 # Lane for bulk directory syncs
+
     def __init__(self, tgt:str, args:ArgumentParser) -> None:
         Thread.__init__(self, tgt, args)
-        self.__queue = queue.Queue() #  For receiving messages
+        self.__lanes = (deque(), deque()) # (arrival time, path) for PRIORITY and BULK
+        self.__pending = (set(), set()) # Paths waiting in each lane
+        self.__maxsize = getattr(args, "sendQueue", 0) # Paths per lane, 0 is unbounded
+        self.__counts = counters(tgt)
+        self.__tWarned = 0
+        self.__cond = threading.Condition()
+        self.__unfinished = 0 # Paths put but not yet sent
+        self.__failed = set() # Paths dropped after their retries, until they are sent
+        self.__retries = [] # (not before, lane, retry count, paths) of failed rsyncs
+        self.__retrying = set() # Paths in __retries
+        self.__inflight = Counter() # Path -> times it is waiting, being sent, or to be retried
+        self.__nBulk = 0 # Workers currently sending bulk batches
+        self.__maxBulk = max(1, args.sendWorkers - 1) # Leave one worker for the priority lane
+        self.__sshCmd = self.__mkSSH(tgt, args)
+        gauge(tgt, "priorityQueue", lambda: len(self.__lanes[self.PRIORITY]))
+        gauge(tgt, "bulkQueue", lambda: len(self.__lanes[self.BULK]))
+        gauge(tgt, "sendBacklog", lambda: self.__unfinished) # Waiting or being sent
 
     @staticmethod
     def addArgs(parser:ArgumentParser) -> ArgumentParser:
@@ -26,57 +70,209 @@ class SendToTarget(Thread):
         grp.add_argument("--tempDirectory", type=str, default="~/.cache",
                 help="Where to write temporary files on the target")
         grp.add_argument("--rsync", type=str, default="/usr/bin/rsync", help="rsync command to use")
+        grp.add_argument("--sendDebounce", type=float, default=2,
+                help="Seconds to collect requests before sending them in one batch")
+        grp.add_argument("--sendWorkers", type=int, default=2,
+                help="Number of rsync workers per target, one is kept for small files")
+        grp.add_argument("--sendRetries", type=int, default=5,
+                help="Number of times to retry a failed rsync before dropping it")
+        grp.add_argument("--sendBackoff", type=float, default=10,
+                help="Seconds before the first retry, doubled for each further retry")
+        grp.add_argument("--ssh", type=str, default="ssh", help="ssh command for rsync to use")
+        grp.add_argument("--sshControlDir", type=str, default="~/.ssh",
+                help="Where to put ssh control sockets")
+        grp.add_argument("--sshPersist", type=int, default=600,
+                help="Seconds an idle ssh control connection is kept open, <=0 disables multiplexing")
         return parser
 
-    def join(self) -> None:
-        self.__queue.join()
+    @staticmethod
+    def __remoteHost(tgt:str) -> str:
+        ''' [user@]host of an rsync remote target, None for a local path '''
+        index = tgt.find(":")
+        if index <= 0 or "/" in tgt[:index]: return None
+        return tgt[:index]
 
-    def put(self, fn:str) -> None:
-        self.__queue.put(fn)
+    @classmethod
+    def __mkSSH(cls, tgt:str, args:ArgumentParser) -> tuple:
+        host = cls.__remoteHost(tgt)
+        if host is None or args.sshPersist <= 0: return None
+        ctlDir = os.path.abspath(os.path.expanduser(args.sshControlDir))
+        os.makedirs(ctlDir, mode=0o700, exist_ok=True)
+        opts = (
+                "-o", "ControlMaster=auto",
+                "-o", "ControlPath=" + os.path.join(ctlDir, "sfmc-%C"),
+                "-o", f"ControlPersist={args.sshPersist}",
+                )
+        # Close the control connection when we exit
+        atexit.register(subprocess.run, (args.ssh,) + opts + ("-O", "exit", host),
+                shell=False, capture_output=True)
+        return (args.ssh,) + opts
 
-    def runIt(self): # Called on start
-        logging.info("Starting")
-        q = self.__queue
+    def join(self, fn:str=None) -> bool:
+        ''' Wait for fn, or everything put, to be sent, returns False if fn was dropped '''
+        with self.__cond:
+            if fn is None:
+                while self.__unfinished:
+                    self.__cond.wait()
+                return True
+            fn = os.path.normpath(fn)
+            while self.__inflight[fn]: # Not other callers' paths
+                self.__cond.wait()
+            if fn not in self.__failed: return True
+            self.__failed.discard(fn)
+            return False
+
+    def put(self, fn:str, bulk:bool=False) -> None:
+        lane = self.BULK if bulk else self.PRIORITY
+        with self.__cond:
+            while True:
+                if fn in self.__pending[lane] \
+                        or os.path.normpath(fn) in self.__retrying: # Will go out with it
+                    self.__counts["sendCoalesced"] += 1
+                    return
+                if not self.__maxsize or len(self.__lanes[lane]) < self.__maxsize: break
+                self.__counts["sendBlocked"] += 1
+                if time.time() - self.__tWarned >= 60:
+                    self.__tWarned = time.time()
+                    logging.warning("Lane %s is full, applying backpressure, %s paths",
+                            lane, len(self.__lanes[lane]))
+                self.__cond.wait()
+            self.__lanes[lane].append((time.time(), fn))
+            self.__pending[lane].add(fn)
+            self.__inflight[os.path.normpath(fn)] += 1
+            self.__unfinished += 1
+            self.__cond.notify_all()
+
+    def __take(self, qBulk:bool) -> tuple:
+        ''' Wait for a debounced batch or a retry, returns (lane, paths, retry count) '''
+        debounce = self.args.sendDebounce
+        lanes = self.__lanes
+        retries = self.__retries
+        with self.__cond:
+            while True:
+                now = time.time()
+                qBulkOkay = qBulk and self.__nBulk < self.__maxBulk
+                dtRetry = None # Until the next retry this worker can take
+                for (index, (tRetry, lane, cnt, paths)) in enumerate(retries):
+                    if lane == self.BULK and not qBulkOkay: continue
+                    if tRetry <= now:
+                        del retries[index]
+                        self.__retrying.difference_update(paths)
+                        if lane == self.BULK: self.__nBulk += 1
+                        return (lane, paths, cnt)
+                    dtRetry = tRetry - now if dtRetry is None else min(dtRetry, tRetry - now)
+                if lanes[self.PRIORITY]:
+                    lane = self.PRIORITY
+                elif qBulkOkay and lanes[self.BULK]:
+                    lane = self.BULK
+                else:
+                    self.__cond.wait(dtRetry)
+                    continue
+                dt = lanes[lane][0][0] + debounce - now
+                if dt > 0: # Let a burst of requests accumulate
+                    self.__cond.wait(dt if dtRetry is None else min(dt, dtRetry))
+                    continue
+                batch = [item[1] for item in lanes[lane]]
+                lanes[lane].clear()
+                self.__pending[lane].clear()
+                self.__cond.notify_all() # Room for blocked puts
+                if lane == self.BULK: self.__nBulk += 1
+                return (lane, batch, 0)
 
+    def __done(self, lane:int, batch:list, cnt:int, timing:Counter, failed:set, retry:list) -> None:
+        with self.__cond: # Counters are updated by several workers
+            self.__counts.update(timing)
+            self.__failed.difference_update(os.path.normpath(fn) for fn in batch)
+            self.__failed.update(failed)
+            inflight = self.__inflight
+            inflight.subtract(os.path.normpath(fn) for fn in batch)
+            if retry: # Still unfinished
+                dt = self.args.sendBackoff * (2 ** cnt)
+                self.__retries.append((time.time() + dt, lane, cnt + 1, retry))
+                self.__retrying.update(retry)
+                inflight.update(retry)
+            for fn in batch:
+                fn = os.path.normpath(fn)
+                if inflight[fn] <= 0: inflight.pop(fn, None)
+            if lane == self.BULK: self.__nBulk -= 1
+            self.__unfinished -= len(batch) - len(retry)
+            self.__cond.notify_all()
+
+    @staticmethod
+    def __logOutput(log, sp:subprocess.CompletedProcess) -> None:
+        for (name, output) in (("STDOUT", sp.stdout), ("STDERR", sp.stderr)):
+            if not output: continue
+            try:
+                log("%s: %s", name, str(output, "utf-8"))
+            except:
+                log("%s: %s", name, output)
+
+    def __rsync(self, parent:str, names:list) -> bool:
+        cmd = [
+                self.args.rsync,
+                "--archive",
+                "--recursive", # Not implied by --archive with --files-from
+                "--verbose",
+                "--temp-dir", self.args.tempDirectory,
+                "--files-from=-",
+                "--exclude", "*.compacting", # Half written by the Compactor in a synced directory
+                ]
+        if self.__sshCmd: cmd.extend(("--rsh", shlex.join(self.__sshCmd)))
+        cmd.extend((parent, self.name))
+        logging.info("cmd %s files %s", cmd, names)
+        sp = subprocess.run(cmd, shell=False, capture_output=True,
+                input=bytes("\n".join(names) + "\n", "utf-8"))
+        if sp.returncode:
+            logging.warning("cmd %s files %s", cmd, names)
+            logging.warning("return code %s", sp.returncode)
+            self.__logOutput(logging.warning, sp)
+            return False
+        self.__logOutput(logging.info, sp)
+        return True
+
+    def __send(self, paths:list, cnt:int, timing:Counter, failed:set, retry:list) -> None:
+        # Group by parent directory so each group is one rsync with a files-from list
+        # relative to the parent, which preserves the basename layout on the target.
+        groups = {}
+        for fn in paths:
+            fn = os.path.normpath(fn)
+            (parent, name) = os.path.split(fn)
+            groups.setdefault(parent if parent else ".", []).append(name)
+
+        args = self.args
+        for parent in groups:
+            t0 = time.time()
+            qOkay = self.__rsync(parent, groups[parent])
+            timing["rsyncs"] += 1
+            timing["rsyncSeconds"] += time.time() - t0
+            if qOkay: continue
+            timing["rsyncFailures"] += 1
+            names = [os.path.normpath(os.path.join(parent, name)) for name in groups[parent]]
+            if cnt >= args.sendRetries:
+                logging.error("Dropping %s %s after %s retries", parent, groups[parent], cnt)
+                failed.update(names)
+            else: # Set aside, so this worker is free in the meantime
+                logging.info("Retrying %s in %s seconds", parent, args.sendBackoff * (2 ** cnt))
+                retry.extend(names)
+
+    def __work(self, qBulk:bool) -> None:
         while True:
-            fn = q.get()
-            logging.info("SendTo %s", fn)
-            cmd = (
-                    self.args.rsync,
-                    "--archive",
-                    "--verbose",
-                    "--temp-dir", self.args.tempDirectory,
-                    fn,
-                    self.name)
-            logging.info("cmd %s", cmd)
-            sp = subprocess.run(cmd, shell=False, capture_output=True)
-            if sp.returncode:
-                logging.warning("cmd %s", cmd)
-                logging.warning("return code %s", sp.returncode)
-                if sp.stdout:
-                    try:
-                        logging.warning("STDOUT: %s", str(sp.stdout, "utf-8"))
-                    except:
-                        logging.warning("STDOUT: %s", sp.stdout)
-                if sp.stderr:
-                    try:
-                        logging.warning("STDERR: %s", str(sp.stderr, "utf-8"))
-                    except:
-                        logging.warning("STDERR: %s", sp.stderr)
-            else:
-                logging.info("cmd %s", cmd)
-                if sp.stdout:
-                    try:
-                        logging.info("STDOUT: %s", str(sp.stdout, "utf-8"))
-                    except:
-                        logging.info("STDOUT: %s", sp.stdout)
-                if sp.stderr:
-                    try:
-                        logging.info("STDERR: %s", str(sp.stderr, "utf-8"))
-                    except:
-                        logging.info("STDERR: %s", sp.stderr)
-            q.task_done()
-            logging.info("Task done")
+            (lane, batch, cnt) = self.__take(qBulk)
+            timing = Counter()
+            failed = set()
+            retry = []
+            try:
+                logging.info("SendTo lane %s paths %s", lane, len(batch))
+                self.__send(batch, cnt, timing, failed, retry)
+            finally:
+                self.__done(lane, batch, cnt, timing, failed, retry)
+
+    def runIt(self): # Called on start
+        n = max(1, self.args.sendWorkers)
+        logging.info("Starting %s workers", n)
+        for index in range(1, n):
+            SendWorker(f"{self.name}:{index}", self.args, self.__work, True).start()
+        self.__work(n == 1) # With more than one worker, this is the priority lane
 
 if __name__ == "__main__":
     parser = ArgumentParser()
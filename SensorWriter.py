@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+#
+# Buffer sensor records in memory and append them to a NetCDF file in batches
+#
+# The Dataset is kept open between batches, so HDF5 open/close and metadata
+# overhead is paid once rather than once per record.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import logging
+import os
+import threading
+import time
+import numpy as np
+from datetime import datetime, timezone
+from netCDF4 import Dataset
+
+# The HDF5 library is not thread safe, so every NetCDF operation in the process goes
+# through this. The asyncio engine flushes different gliders' writers from its
+# executor threads. The Compactor works in a child process, so it does not need it.
+hdfLock = threading.RLock()
+
+class SensorWriter:
+    def __init__(self, ofn:str, flushCount:int=1, flushInterval:float=0,
+            chunk:int=0, complevel:int=0, shuffle:bool=False,
+            rotate:float=0, compactor=None) -> None:
+        self.__ofn = ofn
+        self.__flushCount = max(1, flushCount)
+        self.__flushInterval = flushInterval
+        self.__rotate = rotate # Seconds of data per file, 0 never rotates
+        self.__compactor = compactor # Where to send rotated files to
+        # Storage options for each variable
+        self.__varOpts = dict(
+                compression="zlib" if complevel > 0 else None,
+                complevel=complevel if complevel > 0 else 4,
+                shuffle=shuffle and complevel > 0,
+                )
+        if chunk > 0: self.__varOpts["chunksizes"] = (chunk,)
+        self.__nc = None
+        self.__tStart = None # Time of the first record in the open file
+        self.__records = [] # (time, {name: (units, value)})
+        self.__tFirst = None # When the oldest buffered record was appended
+
+    @property
+    def filename(self) -> str:
+        return self.__ofn
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def timeout(self) -> float:
+        ''' Seconds until buffered records need to be flushed, None if nothing is buffered '''
+        if self.__tFirst is None or self.__flushInterval <= 0: return None
+        return max(0, self.__tFirst + self.__flushInterval - time.time())
+
+    def append(self, t:float, sensors:dict) -> bool:
+        ''' Buffer a record, sensors is name -> (units, value), returns True if flushed '''
+        if not self.__records: self.__tFirst = time.time()
+        self.__records.append((t, sensors))
+        if len(self.__records) >= self.__flushCount or self.timeout() == 0:
+            return self.flush()
+        return False
+
+    def __open(self) -> Dataset:
+        if self.__nc is None or not self.__nc.isopen():
+            ofn = self.__ofn
+            self.__nc = Dataset(ofn, "a" if os.path.isfile(ofn) else "w", format="NETCDF4")
+        nc = self.__nc
+        if "time" not in nc.dimensions:
+            nc.createDimension("time")
+            var = nc.createVariable("time", "f8", ("time",), **self.__varOpts)
+            var.setncattr("units", "seconds since 1970-01-01")
+        if self.__tStart is None and len(nc.dimensions["time"]):
+            self.__tStart = float(nc["time"][0])
+        return nc
+
+    def __closeDataset(self) -> None:
+        if self.__nc is not None and self.__nc.isopen():
+            self.__nc.close()
+        self.__nc = None
+        self.__tStart = None
+
+    def __rotateFile(self) -> None:
+        ''' Move the current file out of the way and hand it to the compactor '''
+        tStart = self.__tStart
+        self.__closeDataset()
+        (base, ext) = os.path.splitext(self.__ofn)
+        stamp = datetime.fromtimestamp(tStart, tz=timezone.utc).strftime("%Y%m%dT%H%M%S")
+        fn = f"{base}.{stamp}{ext}"
+        os.replace(self.__ofn, fn)
+        logging.info("Rotated %s to %s", self.__ofn, fn)
+        if self.__compactor is not None:
+            self.__compactor.put(fn)
+
+    def flush(self) -> bool:
+        ''' Write all buffered records, returns True if anything was written '''
+        with hdfLock:
+            records = self.__records
+            if not records: return False
+            nc = self.__open()
+            if self.__rotate > 0 and self.__tStart is not None \
+                    and (records[0][0] - self.__tStart) >= self.__rotate:
+                self.__rotateFile()
+                nc = self.__open()
+            n = len(records)
+            i0 = len(nc.dimensions["time"])
+            i1 = i0 + n
+            nc["time"][i0:i1] = [rec[0] for rec in records]
+
+            columns = {}
+            for (index, (t, sensors)) in enumerate(records):
+                for name in sensors:
+                    (units, val) = sensors[name]
+                    if name not in columns:
+                        if name not in nc.variables:
+                            # Earlier records are left as fill values
+                            var = nc.createVariable(name, "f4", ("time",), **self.__varOpts)
+                            var.setncattr("units", units)
+                        columns[name] = np.ma.masked_all((n,), dtype="f4")
+                    columns[name][index] = val
+
+            for name in columns: # Records where name was absent remain masked
+                nc[name][i0:i1] = columns[name]
+
+            if self.__tStart is None: self.__tStart = float(records[0][0])
+            nc.sync()
+            logging.debug("Flushed %s records to %s", n, self.__ofn)
+            self.__records = []
+            self.__tFirst = None
+            return True
+
+    def close(self) -> None:
+        self.flush()
+        with hdfLock:
+            self.__closeDataset()
@@ -10,26 +10,52 @@ from argparse import ArgumentParser
 import logging
 import queue
 import os
+import threading
+import atexit
 import numpy as np
-from netCDF4 import Dataset
 import time
+from time import perf_counter
 from datetime import datetime, timezone, timedelta
 from TPWUtils.Thread import Thread
 from SendTo import SendToTarget
+from Stats import counters
+from SensorWriter import SensorWriter
+from Compact import Compactor
+from PolicyQueue import PolicyQueue
+import State
 
 class Sensors(Thread):
-    def __init__(self, glider:str, args:ArgumentParser, sendTo:SendToTarget) -> None:
+    def __init__(self, glider:str, args:ArgumentParser, sendTo:SendToTarget,
+            compactor:Compactor=None) -> None:
         Thread.__init__(self, "SN:" + glider, args)
         self.__gliderName = glider
         self.__sendTo = sendTo
-        self.__queue = queue.Queue()
+        self.__compactor = compactor
+        # Only the latest value of each sensor matters, devices() is a barrier
+        self.__queue = PolicyQueue(glider, "sensor", args.sensorQueue, "latest",
+                key=lambda item: item[0])
         self.__sensors = dict()
+        self.__writer = None
+        self.__counts = counters(glider)
+        atexit.register(self.close) # Write buffered records on a clean shutdown
 
     @staticmethod
     def addArgs(parser:ArgumentParser) -> ArgumentParser:
         grp = parser.add_argument_group(description="Dialog Sensor options")
         grp.add_argument("--sensorDir", type=str, default="./sensors", 
                 help="Where to write sensor files to")
+        grp.add_argument("--sensorFlushCount", type=int, default=1,
+                help="Number of sensor records to buffer before writing them")
+        grp.add_argument("--sensorFlushInterval", type=float, default=0,
+                help="Maximum seconds to buffer sensor records before writing them, 0 only by count")
+        grp.add_argument("--sensorChunk", type=int, default=0,
+                help="Records per chunk along time in sensor files, 0 uses the library default")
+        grp.add_argument("--sensorCompress", type=int, default=0,
+                help="zlib compression level for sensor variables, 0 disables")
+        grp.add_argument("--sensorShuffle", action="store_true",
+                help="Apply the shuffle filter to compressed sensor variables")
+        grp.add_argument("--sensorRotate", type=float, default=0,
+                help="Seconds of data per sensor file before it is rotated and compacted, 0 never")
 
     def put(self, name:str, units:str, val:str, time:float) -> None:
         self.__queue.put((name, units, val, time))
@@ -37,10 +63,30 @@ class Sensors(Thread):
     def devices(self):
         self.__queue.put((None, None, None, None))
 
-    def __dump(self, ofn:str) -> None:
+    def checkpoint(self, parserState:dict, done:threading.Event=None) -> None:
+        ''' Save parserState with the sensors, once the updates queued before it are applied '''
+        self.__queue.put((None, "checkpoint", parserState, done))
+
+    def saveState(self, parserState:dict) -> None:
+        ''' Write buffered records, then save parserState and the current sensors '''
+        self.flush()
+        State.save(self.args, self.__gliderName + ".parser",
+                dict(parser=parserState, sensors=dict(self.__sensors)))
+        self.__counts["checkpoints"] += 1
+
+    def __send(self) -> None:
+        if self.__sendTo:
+            for tgt in self.__sendTo:
+                tgt.put(self.args.sensorDir)
+
+    def update(self, name:str, units:str, val:float, t:float) -> None:
+        self.__sensors[name] = (units, val, t)
+
+    def record(self) -> tuple:
+        ''' Snapshot the current sensors as (time, {name: (units, value)}), None if empty '''
         sensors = self.__sensors
 
-        if not sensors: return
+        if not sensors: return None
 
         times = []
         for name in sensors:
@@ -48,36 +94,90 @@ class Sensors(Thread):
      
         time = np.median(times)
 
-        with Dataset(ofn, "a" if os.path.isfile(ofn) else "w", format="NETCDF4") as nc:
-            if "time" not in nc.dimensions:
-                nc.createDimension("time")
-                var = nc.createVariable("time", "f8", ("time",))
-                var.setncattr("units", "seconds since 1970-01-01")
-            index = len(nc.dimensions["time"])
-            nc["time"][index] = time
-            for name in sensors:
-                if name not in nc.variables:
-                    var = nc.createVariable(name, "f4", ("time",))
-                    var.setncattr("units", sensors[name][0])
-                nc[name][index] = sensors[name][1]
-        if self.__sendTo:
-            for tgt in self.__sendTo:
-                tgt.put(self.args.sensorDir)
-        return 
+        record = dict()
+        for name in sensors:
+            record[name] = sensors[name][:2] # (units, value)
+        return (time, record)
 
-    def runIt(self): # Called on start
-        ofn = os.path.join(self.args.sensorDir, self.__gliderName + ".sensors.nc")
+    def write(self, time:float, record:dict) -> None:
+        counts = self.__counts
+        counts["sensorRecords"] += 1
+        t0 = perf_counter()
+        qFlushed = self.__writer.append(time, record)
+        counts["sensorWriteSeconds"] += perf_counter() - t0
+        if qFlushed:
+            counts["sensorFlushes"] += 1
+            self.__send()
+
+    def flush(self) -> None:
+        t0 = perf_counter()
+        qFlushed = self.__writer.flush()
+        self.__counts["sensorWriteSeconds"] += perf_counter() - t0
+        if qFlushed:
+            self.__counts["sensorFlushes"] += 1
+            self.__send()
+
+    def timeout(self) -> float:
+        return self.__writer.timeout()
+
+    def close(self) -> None:
+        ''' Write buffered records and close the file '''
+        if not self.is_alive() or threading.current_thread() is self:
+            if self.__writer: self.__writer.close()
+            return
+        # The sensors' thread owns the writer, so it closes it after the queued updates
+        done = threading.Event()
+        try:
+            self.__queue.put((None, "close", None, done), timeout=10)
+        except queue.Full:
+            logging.warning("Unable to close %s, its queue is full", self.name)
+            return
+        if not done.wait(10):
+            logging.warning("Timed out waiting for %s to close", self.name)
+
+    def prepare(self) -> None:
+        ''' Create the output directory and writer '''
+        args = self.args
+        ofn = os.path.join(args.sensorDir, self.__gliderName + ".sensors.nc")
         logging.info("Starting %s", ofn)
 
-        if not os.path.isdir(self.args.sensorDir):
-            logging.info("Creating %s", self.args.sensorDir)
-            os.makedirs(self.args.sensorDir, mode=0o755, exist_ok=True)
+        if not os.path.isdir(args.sensorDir):
+            logging.info("Creating %s", args.sensorDir)
+            os.makedirs(args.sensorDir, mode=0o755, exist_ok=True)
+
+        if State.checkpointing(args): # Pick up the sensors from before a restart
+            state = State.load(args, self.__gliderName + ".parser")
+            if state:
+                for (name, item) in state.get("sensors", {}).items():
+                    self.__sensors[name] = tuple(item)
+                logging.info("Restored %s sensors", len(self.__sensors))
+
+        self.__writer = SensorWriter(ofn, args.sensorFlushCount, args.sensorFlushInterval,
+                chunk=args.sensorChunk, complevel=args.sensorCompress,
+                shuffle=args.sensorShuffle,
+                rotate=args.sensorRotate, compactor=self.__compactor)
+
+    def runIt(self): # Called on start
+        self.prepare()
 
         q = self.__queue
 
         while True:
-            (name, units, val, t) = q.get()
+            try:
+                (name, units, val, t) = q.get(timeout=self.timeout())
+            except queue.Empty:
+                self.flush()
+                continue
             if name is None:
-                self.__dump(ofn)
+                if units == "checkpoint":
+                    self.saveState(val)
+                    if t is not None: t.set() # Done
+                elif units == "close":
+                    self.close()
+                    t.set()
+                    return
+                else: # devices
+                    record = self.record()
+                    if record: self.write(*record)
             else:
-                self.__sensors[name] = (units, val, t)
+                self.update(name, units, val, t)
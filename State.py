@@ -0,0 +1,45 @@
+#! /usr/bin/env python3
+#
+# Small JSON state files which survive restarts
+#
+# Files are replaced atomically, so a crash while saving leaves the previous state.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import json
+import logging
+import os
+
+def addArgs(parser:ArgumentParser) -> None:
+    grp = parser.add_argument_group(description="Persistent state options")
+    grp.add_argument("--stateDir", type=str, default="./state",
+            help="Where to keep state used to resume after a restart")
+    grp.add_argument("--checkpointInterval", type=float, default=0,
+            help="Seconds between saves of the dialog parser and sensor state, 0 disables")
+
+def checkpointing(args:ArgumentParser) -> bool:
+    ''' Is the live dialog state checkpointed, never while replaying '''
+    return getattr(args, "checkpointInterval", 0) > 0 and not getattr(args, "replay", None)
+
+def filename(args:ArgumentParser, name:str) -> str:
+    return os.path.join(args.stateDir, name + ".json")
+
+def load(args:ArgumentParser, name:str) -> dict:
+    ''' Return the saved state for name, None if there is none '''
+    fn = filename(args, name)
+    if not os.path.isfile(fn): return None
+    try:
+        with open(fn, "r") as fp:
+            return json.load(fp)
+    except:
+        logging.exception("Unable to load %s", fn)
+        return None
+
+def save(args:ArgumentParser, name:str, state:dict) -> None:
+    fn = filename(args, name)
+    os.makedirs(args.stateDir, mode=0o755, exist_ok=True)
+    tfn = fn + ".tmp"
+    with open(tfn, "w") as fp:
+        json.dump(state, fp)
+    os.replace(tfn, fn)
@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+#
+# Cheap per-glider counters for the hot paths, plus a thread which
+# periodically logs a summary of them
+#
+# A counter is shared by a glider's threads, but each key has a single writer,
+# so no locking is needed.
+# Gauges, such as queue depths, are functions which are only called when
+# the value is wanted.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from collections import Counter
+import logging
+import time
+from TPWUtils.Thread import Thread
+
+_registry = {} # glider -> Counter
+_gauges = {} # (owner, name) -> function returning the current value
+_remoteGauges = {} # owner -> {name: value}, snapshots from shard processes
+
+def counters(glider:str) -> Counter:
+    ''' Return the counters for glider, creating them if needed '''
+    if glider not in _registry:
+        _registry[glider] = Counter()
+    return _registry[glider]
+
+def gliders() -> list:
+    return sorted(_registry.copy()) # copy is atomic, so safe while others are added
+
+def gauge(owner:str, name:str, func) -> None:
+    ''' Register func() as the current value of owner's name '''
+    _gauges[(owner, name)] = func
+
+def setGauges(owner:str, values:dict) -> None:
+    ''' Record gauge values measured in another process '''
+    _remoteGauges[owner] = values
+
+def gauges() -> dict:
+    ''' {owner: {name: value}} '''
+    values = {owner: dict(_remoteGauges[owner]) for owner in list(_remoteGauges)}
+    for ((owner, name), func) in list(_gauges.items()):
+        try:
+            values.setdefault(owner, {})[name] = func()
+        except:
+            logging.exception("Evaluating gauge %s %s", owner, name)
+    return values
+
+class Stats(Thread):
+    def __init__(self, args:ArgumentParser) -> None:
+        Thread.__init__(self, "Stats", args)
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Statistics options")
+        grp.add_argument("--statsInterval", type=float, default=600,
+                help="Seconds between counter summaries, <=0 disables them")
+        grp.add_argument("--trace", type=int, default=0,
+                help="Log every Nth dialog line, 1 logs every line, 0 disables")
+        return parser
+
+    @staticmethod
+    def summary(glider:str) -> str:
+        cnts = counters(glider)
+        return " ".join(f"{key} {cnts[key]}" for key in sorted(cnts))
+
+    def runIt(self): # Called on start
+        dt = self.args.statsInterval
+        logging.info("Starting interval %s", dt)
+        if dt <= 0: return
+
+        while True:
+            time.sleep(dt)
+            for glider in gliders():
+                logging.info("%s %s", glider, self.summary(glider))
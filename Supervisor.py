@@ -0,0 +1,290 @@
+#! /usr/bin/env python3
+#
+# Split the gliders across worker processes, shards, so one glider's parsing,
+# NetCDF, or zip work can not starve the others of the interpreter.
+#
+# The supervisor owns the rsync targets, so each target has one connection
+# pool no matter how many shards there are. Shards send their transfer
+# requests, join requests, counters, fixes, and log records to the supervisor over
+# multiprocessing queues. A shard which dies is restarted on its own.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import multiprocessing as mp
+import logging
+import logging.handlers
+import threading
+import itertools
+import signal
+import time
+import sys
+import os
+from TPWUtils.Thread import Thread
+from ParseDialog import ParseDialog, addFixListener, notifyFix
+from Sensors import Sensors
+from Compact import Compactor
+from DownloadFiles import DownloadFiles
+from Scheduler import Scheduler
+from MonitorGlider import MonitorGlider
+from AsyncEngine import AsyncEngine
+from Stats import counters, gliders, gauges, setGauges
+from Profiler import Profiler
+
+def startGliders(args:ArgumentParser, names:list, sendTo:list, slots=None) -> list:
+    ''' Start the threads which monitor the gliders in names, returns the top level threads '''
+    scheduler = Scheduler(args, slots, len(names)) # Shared by every glider's SFMC API calls
+
+    compactor = None
+    if args.sensorRotate > 0:
+        compactor = Compactor(args, sendTo)
+        compactor.start()
+
+    threads = []
+    if args.engine == "asyncio": # All gliders on one event loop
+        args.glider = names
+        threads.append(AsyncEngine(args, sendTo, scheduler, compactor))
+        threads[-1].start()
+    else:
+        for glider in names:
+            sensors = Sensors(glider, args, sendTo, compactor)
+            sensors.start()
+            download = DownloadFiles(glider, args, sendTo, scheduler)
+            download.start()
+            # With track products, they are sent instead of the position CSVs
+            parser = ParseDialog(glider, args, [] if args.productDir else sendTo,
+                    sensors, download)
+            parser.start()
+            threads.append(MonitorGlider(glider, args, parser))
+            threads[-1].start()
+    return threads
+
+def partition(names:list, weights:dict, n:int) -> list:
+    ''' Split names into n lists with similar total weight, heaviest first '''
+    shards = [[] for i in range(n)]
+    loads = [0] * n
+    for name in sorted(names, key=lambda x: -weights.get(x, 1)):
+        index = loads.index(min(loads))
+        shards[index].append(name)
+        loads[index] += weights.get(name, 1)
+    return [shard for shard in shards if shard]
+
+class ShardTarget:
+    ''' Stand in for a SendToTarget, forwarding to the supervisor's target '''
+    def __init__(self, name:str, index:int, shard:int, requests:mp.Queue, replies) -> None:
+        self.name = name
+        self.__index = index
+        self.__shard = shard
+        self.__requests = requests
+        self.__replies = replies
+
+    def __repr__(self) -> str:
+        return f"<ShardTarget({self.name})>"
+
+    def put(self, fn:str, bulk:bool=False) -> None:
+        self.__requests.put(("put", self.__index, fn, bulk))
+
+    def join(self, fn:str=None) -> bool:
+        (token, reply) = self.__replies.expect()
+        self.__requests.put(("join", self.__shard, token, self.__index, fn))
+        reply[0].wait()
+        return reply[1]
+
+class ShardReplies(Thread):
+    ''' Wake up joins waiting on the supervisor in a shard '''
+    def __init__(self, args:ArgumentParser, replies:mp.Queue, generation:int) -> None:
+        Thread.__init__(self, "Replies", args)
+        self.__replies = replies
+        self.__lock = threading.Lock()
+        self.__events = {}
+        self.__generation = generation # Unique to this shard process, across restarts
+        self.__tokens = itertools.count()
+
+    def expect(self) -> tuple:
+        ''' A token and its [event, result] '''
+        with self.__lock:
+            token = (self.__generation, next(self.__tokens))
+            self.__events[token] = [threading.Event(), None]
+            return (token, self.__events[token])
+
+    def runIt(self): # Called on start
+        while True:
+            (token, result) = self.__replies.get()
+            with self.__lock:
+                reply = self.__events.pop(token, None)
+            if reply is not None:
+                reply[1] = result
+                reply[0].set()
+
+class ShardStatus(Thread):
+    ''' Periodically send a shard's counters to the supervisor '''
+    def __init__(self, args:ArgumentParser, shard:int, requests:mp.Queue) -> None:
+        Thread.__init__(self, "Status", args)
+        self.__shard = shard
+        self.__requests = requests
+
+    def runIt(self): # Called on start
+        ppid = os.getppid()
+        dt = max(1, min(60, self.args.statsInterval))
+        while True:
+            time.sleep(dt)
+            if os.getppid() != ppid:
+                logging.error("Supervisor exited")
+                os._exit(1)
+            self.__requests.put(("status", self.__shard,
+                {glider: dict(counters(glider)) for glider in gliders()},
+                gauges()))
+
+def runShard(shard:int, names:list, args:ArgumentParser, targets:list,
+        requests:mp.Queue, replies:mp.Queue, logQueue:mp.Queue, slots, generation:int) -> None:
+    ''' Entry point of a shard process '''
+    logger = logging.getLogger()
+    logger.handlers.clear()
+    logger.addHandler(logging.handlers.QueueHandler(logQueue))
+    logger.setLevel(logging.DEBUG if args.debug else logging.INFO) # As monitor.py's logger
+
+    def sigTerm(signum, frame) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, sigTerm)
+
+    threading.current_thread().name = f"Shard{shard}"
+    logging.info("Starting %s", names)
+
+    waiter = ShardReplies(args, replies, generation)
+    waiter.start()
+    sendTo = [ShardTarget(name, index, shard, requests, waiter) \
+            for (index, name) in enumerate(targets)]
+    ShardStatus(args, shard, requests).start()
+    if args.trackPort > 0 or args.productDir: # The supervisor keeps the tracks
+        addFixListener(lambda *fix: requests.put(("fix", *fix)))
+    startGliders(args, names, sendTo, slots)
+
+    profiler = Profiler(args) # The supervisor forwards SIGUSR1 and SIGUSR2
+    profiler.installSignals()
+    profiler.start()
+
+    try:
+        Thread.waitForException()
+    except SystemExit:
+        logging.info("Terminated")
+    except:
+        logging.exception("Unexpected termination")
+        sys.exit(1)
+
+class Supervisor(Thread):
+    def __init__(self, args:ArgumentParser, sendTo:list) -> None:
+        Thread.__init__(self, "Supervisor", args)
+        self.__sendTo = sendTo
+        self.__ctx = mp.get_context("spawn") # Do not fork a process full of threads
+        self.__requests = self.__ctx.Queue()
+        self.__logQueue = self.__ctx.Queue()
+        self.__shards = [] # [names, process, replies, restarts, tRestart, tStarted]
+        self.__slots = None # SFMC API calls running across all the shards
+        self.__generations = itertools.count() # Tells shard processes apart across restarts
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Multi-process options")
+        grp.add_argument("--shards", type=int, default=0,
+                help="Number of worker processes to split the gliders across, 0 runs them here")
+        grp.add_argument("--weight", type=str, action="append", metavar="glider=weight",
+                help="Relative load of a glider when splitting them across shards")
+        return parser
+
+    def __weights(self) -> dict:
+        weights = {}
+        for item in self.args.weight or []:
+            (name, weight) = item.split("=", 1)
+            weights[name] = float(weight)
+        return weights
+
+    def __start(self, index:int) -> None:
+        info = self.__shards[index]
+        args = self.args
+        shardArgs = type(args)(**vars(args))
+        shardArgs.shards = 0
+        # Each shard has its own scheduler, so split the global rate between them,
+        # while the concurrency cap is the shared semaphore
+        shardArgs.sfmcRate = args.sfmcRate / len(self.__shards)
+        info[2] = self.__ctx.Queue() # Replies meant for a dead shard are not seen by its successor
+        proc = self.__ctx.Process(target=runShard,
+                name=f"Shard{index}",
+                args=(index, info[0], shardArgs, [tgt.name for tgt in self.__sendTo],
+                    self.__requests, info[2], self.__logQueue, self.__slots,
+                    next(self.__generations)),
+                daemon=True)
+        proc.start()
+        info[1] = proc
+        info[5] = time.time()
+        logging.info("Started shard %s pid %s %s", index, proc.pid, info[0])
+
+    def signalShards(self, signum:int) -> None:
+        ''' Send signum to every running shard '''
+        for info in self.__shards:
+            proc = info[1]
+            if proc is not None and proc.is_alive():
+                try:
+                    os.kill(proc.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def __join(self, replies:mp.Queue, token:tuple, index:int, fn:str) -> None:
+        replies.put((token, self.__sendTo[index].join(fn)))
+
+    def __dispatch(self) -> None:
+        ''' Handle requests from the shards '''
+        while True:
+            msg = self.__requests.get()
+            try:
+                if msg[0] == "put":
+                    self.__sendTo[msg[1]].put(msg[2], bulk=msg[3])
+                elif msg[0] == "join": # Do not block other requests while waiting
+                    threading.Thread(target=self.__join,
+                            args=(self.__shards[msg[1]][2], *msg[2:]), daemon=True).start()
+                elif msg[0] == "fix":
+                    notifyFix(*msg[1:])
+                elif msg[0] == "status":
+                    for (glider, cnts) in msg[2].items():
+                        cnt = counters(glider)
+                        cnt.clear()
+                        cnt.update(cnts)
+                    for (owner, values) in msg[3].items():
+                        setGauges(owner, values)
+                else:
+                    logging.warning("Unknown request %s", msg)
+            except:
+                logging.exception("Handling %s", msg)
+
+    def runIt(self): # Called on start
+        args = self.args
+        shards = partition(args.glider, self.__weights(), args.shards)
+        self.__shards = [[names, None, None, 0, 0, 0] for names in shards]
+        self.__slots = self.__ctx.BoundedSemaphore(max(1, args.sfmcConcurrency))
+        logging.info("Splitting %s gliders across %s shards", len(args.glider), len(shards))
+
+        listener = logging.handlers.QueueListener(self.__logQueue,
+                *logging.getLogger().handlers, respect_handler_level=True)
+        listener.start()
+
+        threading.Thread(target=self.__dispatch, name="Dispatch", daemon=True).start()
+
+        for index in range(len(self.__shards)): self.__start(index)
+
+        while True:
+            time.sleep(1)
+            for (index, info) in enumerate(self.__shards):
+                proc = info[1]
+                now = time.time()
+                if proc.is_alive():
+                    if info[3] and now - info[5] >= 300: # Healthy again, so reset the backoff
+                        info[3] = 0
+                    continue
+                if info[4] == 0: # Just noticed, so back off before restarting
+                    info[3] += 1
+                    info[4] = now + min(300, 5 * 2 ** min(info[3], 6))
+                    logging.warning("Shard %s %s exited with %s, restart %s at %s",
+                            index, info[0], proc.exitcode, info[3], time.ctime(info[4]))
+                elif now >= info[4]:
+                    info[4] = 0
+                    self.__start(index)
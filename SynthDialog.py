@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+#
+# Generate realistic synthetic glider dialog for benchmarking
+#
+# Each surfacing has a Curr Time: line, a few GPS Location: lines a few
+# seconds apart, some of them without a fix, a devices: block of sensor:
+# lines, zModem transfer lines, and noise. The glider drifts in a random walk.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone, timedelta
+import random
+
+NOISE = (
+        b"Vehicle Name: synth\r\n",
+        b"Because:Surface_BeaconCheck [behavior surface_2 start_when = 12]\r\n",
+        b"MissionName:synth.mi MissionNum:unit_000-2026-289-0-0 (0000.0000)\r\n",
+        b"Waypoint: (0.0000,0.0000) Range: 1234m, Bearing: 123deg, Age: 0:01:23h:m:s\r\n",
+        b"Glider is in surface dialog\r\n",
+        b"\r\n",
+        b"sbd: 1234 bytes sent\r\n",
+        b"Hit Control-R to RESUME the mission, or Control-E to extend surface time\r\n",
+        )
+
+def degMin(deg:float) -> float:
+    ''' Decimal degrees to the glider's DDMM.MMMM '''
+    sign = -1 if deg < 0 else 1
+    deg = abs(deg)
+    return sign * (int(deg) * 100 + (deg - int(deg)) * 60)
+
+def generate(surfacings:int, nSensors:int=20, nFixes:int=3, nFiles:int=4, nNoise:int=10,
+        interval:float=3600, t0:datetime=None, seed:int=0):
+    ''' Generate dialog lines for surfacings surfacings '''
+    rng = random.Random(seed)
+    t = t0 or datetime(2025, 1, 1, tzinfo=timezone.utc)
+    lat = 44.6
+    lon = -124.5
+    names = [(f"m_sensor{i}", rng.choice(("nodim", "m", "m/s", "rad", "bar", "%", "degC"))) \
+            for i in range(nSensors)]
+    for surfacing in range(surfacings):
+        lat += rng.gauss(0, 0.01)
+        lon += rng.gauss(0, 0.01)
+        for i in range(rng.randint(0, nNoise)):
+            yield rng.choice(NOISE)
+        for i in range(nFixes):
+            ts = t + timedelta(seconds=20 * i)
+            yield bytes(ts.strftime("Curr Time: %a %b %d %H:%M:%S %Y MT:") \
+                    + f" {int(ts.timestamp()) % 1000000:7d}\r\n", "utf-8")
+            if rng.random() < 0.1: # No fix
+                yield b"GPS Location:  69696969.000 N 69696969.000 E measured 1e+308 secs ago\r\n"
+            else:
+                yield bytes(f"GPS Location:  {degMin(lat):.4f} N {degMin(lon):.4f} E measured"
+                        + f" {rng.uniform(1, 60):10.3f} secs ago\r\n", "utf-8")
+            yield bytes(f"   sensor:m_water_vx(m/s)={rng.gauss(0, 0.2):.3f}"
+                    + f" {rng.uniform(1, 100):.1f} secs ago\r\n", "utf-8")
+            if rng.random() < 0.5: yield rng.choice(NOISE)
+        yield b"devices:(t/m/s) errs:  0/ 0/ 0 warn:  0/ 0/ 0 odd:  0/ 0/ 0\r\n"
+        for (name, units) in names:
+            yield bytes(f"    sensor:{name}({units})={rng.uniform(-100, 100):.3f}"
+                    + f" {rng.uniform(1, 4000):.1f} secs ago\r\n", "utf-8")
+        for i in range(rng.randint(0, nFiles)):
+            yield bytes(f"zModem transfer DONE for file {surfacing:04d}{i:04d}.sbd\r\n", "utf-8")
+        t += timedelta(seconds=interval)
+
+def addArgs(parser:ArgumentParser) -> ArgumentParser:
+    grp = parser.add_argument_group(description="Synthetic dialog options")
+    grp.add_argument("--surfacings", type=int, default=1000, help="Number of surfacings")
+    grp.add_argument("--nSensors", type=int, default=20, help="Sensors per devices: block")
+    grp.add_argument("--nFixes", type=int, default=3, help="GPS lines per surfacing")
+    grp.add_argument("--nFiles", type=int, default=4, help="Maximum zModem files per surfacing")
+    grp.add_argument("--nNoise", type=int, default=10, help="Maximum noise lines per surfacing")
+    grp.add_argument("--seed", type=int, default=0, help="Random number seed")
+    return parser
+
+def fromArgs(args:ArgumentParser):
+    return generate(args.surfacings, nSensors=args.nSensors, nFixes=args.nFixes,
+            nFiles=args.nFiles, nNoise=args.nNoise, seed=args.seed)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Write synthetic glider dialog")
+    parser.add_argument("output", type=str, help="Output dialog file")
+    addArgs(parser)
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as fp:
+        fp.writelines(fromArgs(args))
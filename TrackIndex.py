@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+#
+# Keep every glider's track in memory and serve it over HTTP as JSON
+#
+# Each track is time ordered, so "since T" is a binary search. The index is
+# rebuilt from the position CSVs at startup and then fed the fixes
+# ParseDialog accepts, so queries never touch the disk.
+#
+#  /gliders                     {glider: {n, first, last}}
+#  /latest?glider=&bbox=        {glider: {time, lat, lon}}, the latest fix of each glider
+#  /track?glider=&since=&until=&bbox=&limit=
+#                               {glider: [[time, lat, lon], ...]}
+#
+# glider is a comma separated list, all gliders if not given. since and until
+# are ISO 8601 or UNIX seconds. bbox is lonMin,latMin,lonMax,latMax, with
+# lonMin > lonMax wrapping across the antimeridian. limit is the most rows
+# per glider, the oldest after since.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from array import array
+from bisect import bisect_left, bisect_right
+import threading
+import logging
+import json
+import time
+import os
+from TPWUtils.Thread import Thread
+from DialogArchive import parseTime
+
+_lock = threading.Lock() # Fixes are added by parser threads while queries read
+_tracks = {} # glider -> (times, lats, lons)
+
+def fix(glider:str, t:float, lat:float, lon:float) -> None:
+    ''' Add a fix to glider's track '''
+    with _lock:
+        if glider not in _tracks:
+            _tracks[glider] = (array("d"), array("d"), array("d"))
+        (times, lats, lons) = _tracks[glider]
+        if not times or t >= times[-1]:
+            times.append(t)
+            lats.append(lat)
+            lons.append(lon)
+        else: # Out of order, which is rare
+            index = bisect_right(times, t)
+            times.insert(index, t)
+            lats.insert(index, lat)
+            lons.insert(index, lon)
+
+def readCSV(fn:str) -> list:
+    ''' Time sorted [(time, lat, lon), ...] from a position CSV '''
+    rows = []
+    if not os.path.isfile(fn): return rows
+    with open(fn, "r") as fp:
+        for line in fp:
+            fields = line.split(",")
+            if len(fields) != 3 or not fields[0][:1].isdigit(): continue # Header or partial row
+            try:
+                rows.append((float(fields[0]), float(fields[1]), float(fields[2])))
+            except ValueError:
+                logging.warning("Bad row in %s, %s", fn, line.strip())
+    rows.sort()
+    return rows
+
+def load(csvDir:str, glider:str) -> int:
+    ''' Rebuild glider's track from its position CSV, returns the number of fixes '''
+    rows = readCSV(os.path.join(csvDir, glider + ".csv"))
+    if not rows: return 0
+    track = (array("d", [row[0] for row in rows]),
+            array("d", [row[1] for row in rows]),
+            array("d", [row[2] for row in rows]))
+    with _lock:
+        if glider in _tracks: # Keep fixes which arrived while loading and are not in the CSV
+            tLast = track[0][-1]
+            for (t, lat, lon) in zip(*_tracks[glider]):
+                if t > tLast:
+                    for (k, val) in enumerate((t, lat, lon)): track[k].append(val)
+        _tracks[glider] = track
+    return len(rows)
+
+def parseBBox(val:str) -> tuple:
+    ''' lonMin,latMin,lonMax,latMax '''
+    bbox = tuple(float(item) for item in val.split(","))
+    if len(bbox) != 4: raise ValueError(f"bbox needs 4 values, {val}")
+    return bbox
+
+def inBBox(bbox:tuple, lat:float, lon:float) -> bool:
+    if bbox is None: return True
+    (lonMin, latMin, lonMax, latMax) = bbox
+    if not (latMin <= lat <= latMax): return False
+    if lonMin <= lonMax: return lonMin <= lon <= lonMax
+    return lon >= lonMin or lon <= lonMax # Across the antimeridian
+
+def gliders() -> dict:
+    with _lock:
+        return {glider: dict(n=len(times), first=times[0], last=times[-1]) \
+                for (glider, (times, lats, lons)) in sorted(_tracks.items()) if times}
+
+def latest(names:list=None, bbox:tuple=None) -> dict:
+    ''' {glider: {time, lat, lon}} of the latest fix of each glider in bbox '''
+    info = {}
+    with _lock:
+        for glider in names or sorted(_tracks):
+            if glider not in _tracks or not _tracks[glider][0]: continue
+            (times, lats, lons) = _tracks[glider]
+            if inBBox(bbox, lats[-1], lons[-1]):
+                info[glider] = dict(time=times[-1], lat=lats[-1], lon=lons[-1])
+    return info
+
+def track(names:list=None, since:float=None, until:float=None,
+        bbox:tuple=None, limit:int=None) -> dict:
+    ''' {glider: [[time, lat, lon], ...]} for since <= time <= until in bbox '''
+    if limit is not None and limit < 0: raise ValueError(f"limit must not be negative, {limit}")
+    info = {}
+    with _lock:
+        for glider in names or sorted(_tracks):
+            if glider not in _tracks: continue
+            (times, lats, lons) = _tracks[glider]
+            i0 = 0 if since is None else bisect_left(times, since)
+            i1 = len(times) if until is None else bisect_right(times, until)
+            rows = []
+            for index in range(i0, i1):
+                if not inBBox(bbox, lats[index], lons[index]): continue
+                rows.append([times[index], lats[index], lons[index]])
+                if limit and len(rows) >= limit: break
+            info[glider] = rows
+    return info
+
+class Handler(BaseHTTPRequestHandler):
+    def __reply(self, code:int, info:dict) -> None:
+        body = bytes(json.dumps(info, separators=(",", ":")), "utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = {key: val[-1] for (key, val) in parse_qs(url.query).items()}
+        try:
+            names = query["glider"].split(",") if query.get("glider") else None
+            bbox = parseBBox(query["bbox"]) if query.get("bbox") else None
+            if url.path == "/gliders":
+                info = gliders()
+            elif url.path == "/latest":
+                info = latest(names, bbox)
+            elif url.path == "/track":
+                info = track(names,
+                        since=parseTime(query["since"]) if query.get("since") else None,
+                        until=parseTime(query["until"]) if query.get("until") else None,
+                        bbox=bbox,
+                        limit=int(query["limit"]) if query.get("limit") else None)
+            else:
+                self.__reply(404, dict(error=f"Unknown path {url.path}"))
+                return
+        except ValueError as e:
+            self.__reply(400, dict(error=str(e)))
+            return
+        self.__reply(200, info)
+
+    def log_message(self, fmt:str, *args) -> None:
+        logging.debug(fmt, *args)
+
+class TrackIndex(Thread):
+    def __init__(self, args:ArgumentParser) -> None:
+        Thread.__init__(self, "Tracks", args)
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Track query options")
+        grp.add_argument("--trackPort", type=int, default=0,
+                help="Port to serve glider tracks on as JSON, 0 disables")
+        grp.add_argument("--trackHost", type=str, default="127.0.0.1",
+                help="Address to serve glider tracks on")
+        return parser
+
+    def load(self, names:list) -> None:
+        ''' Rebuild the tracks of names from their CSVs '''
+        t0 = time.time()
+        n = 0
+        for glider in names:
+            n += load(self.args.csvDir, glider)
+        logging.info("Loaded %s fixes for %s gliders in %.3f seconds",
+                n, len(names), time.time() - t0)
+
+    def runIt(self): # Called on start
+        args = self.args
+        if args.trackPort <= 0: return
+        server = ThreadingHTTPServer((args.trackHost, args.trackPort), Handler)
+        server.daemon_threads = True
+        logging.info("Serving tracks on %s:%s", args.trackHost, args.trackPort)
+        server.serve_forever()
@@ -0,0 +1,312 @@
+#! /usr/bin/env python3
+#
+# Keep GeoJSON and KML track products for the fleet up to date as fixes arrive
+#
+# For each glider, in --productDir,
+#   glider.geojson  a FeatureCollection with a Point feature per fix
+#   glider.kml      the track as a LineString plus a placemark at the latest fix
+# and for the whole fleet
+#   fleet.geojson   the latest fix of each glider
+#   fleet.kml       the latest fix of each glider plus a link to its track
+#
+# A glider's documents end in a short tail, which is overwritten, so new fixes
+# are appended in place rather than the documents being regenerated. A fix
+# older than the end of the track is put in order and the glider's documents
+# are rewritten. The fleet documents only hold one point per glider, so they
+# are rewritten. A rewrite which leaves a file unchanged does not resend it.
+# Fixes are batched for --productInterval seconds, then the changed files
+# are sent to the targets, in place of the position CSVs.
+#
+# The documents are rebuilt from the position CSVs at startup. With
+# --productDecimate, fixes older than --productDecimateAge are thinned to
+# one per --productDecimate seconds whenever the documents are rebuilt, at
+# startup and every --productDecimateAge seconds. Without --productDecimate
+# only the last --productDecimateAge seconds of each track are kept in memory,
+# and the rest is read from its CSV when the documents need to be rewritten.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+import logging
+import bisect
+import queue
+import json
+import time
+import os
+from TPWUtils.Thread import Thread
+from PolicyQueue import PolicyQueue
+from TrackIndex import readCSV
+
+def isoTime(t:float) -> str:
+    return datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def decimate(points:list, tOld:float, dt:float) -> list:
+    ''' Keep one point per dt seconds of those before tOld, and every later point '''
+    if dt <= 0: return points
+    kept = []
+    tNext = None
+    for point in points:
+        if point[0] >= tOld or tNext is None or point[0] >= tNext:
+            kept.append(point)
+            tNext = point[0] + dt
+    return kept
+
+def merge(points:list, new:list) -> list:
+    ''' points and new in time order, one point per time, new replacing old '''
+    merged = {point[0]: point for point in points}
+    merged.update((point[0], point) for point in new)
+    return [merged[t] for t in sorted(merged)]
+
+def geoFeature(glider:str, t:float, lat:float, lon:float) -> str:
+    return json.dumps(dict(type="Feature",
+        geometry=dict(type="Point", coordinates=[round(lon, 7), round(lat, 7)]),
+        properties=dict(glider=glider, time=isoTime(t))), separators=(",", ":"))
+
+def kmlPlacemark(glider:str, t:float, lat:float, lon:float) -> str:
+    return f"<Placemark><name>{escape(glider)}</name>" \
+            + f"<TimeStamp><when>{isoTime(t)}</when></TimeStamp>" \
+            + f"<Point><coordinates>{lon:.7f},{lat:.7f},0</coordinates></Point></Placemark>\n"
+
+class Document:
+    ''' A file which is appended to by overwriting its tail '''
+    def __init__(self, fn:str) -> None:
+        self.filename = fn
+        self.__offset = None # Where the tail starts
+
+    def write(self, head:str, body:str, tail:str) -> bool:
+        ''' Replace the whole file, returns False if it was already the same '''
+        content = bytes(head + body, "utf-8")
+        self.__offset = len(content)
+        content += bytes(tail, "utf-8")
+        try:
+            with open(self.filename, "rb") as fp:
+                if fp.read() == content: return False # Nothing to send after a restart
+        except FileNotFoundError:
+            pass
+        tfn = self.filename + ".tmp"
+        with open(tfn, "wb") as fp:
+            fp.write(content)
+        os.replace(tfn, self.filename)
+        return True
+
+    def append(self, body:str, tail:str) -> None:
+        with open(self.filename, "rb+") as fp:
+            fp.seek(self.__offset)
+            fp.write(bytes(body, "utf-8"))
+            self.__offset = fp.tell()
+            fp.write(bytes(tail, "utf-8"))
+            fp.truncate()
+
+class GeoJSONTrack:
+    HEAD = '{"type":"FeatureCollection","features":[\n'
+    TAIL = "\n]}\n"
+
+    def __init__(self, directory:str, glider:str) -> None:
+        self.__glider = glider
+        self.__doc = Document(os.path.join(directory, glider + ".geojson"))
+        self.__qEmpty = True
+
+    @property
+    def filename(self) -> str:
+        return self.__doc.filename
+
+    def write(self, points:list) -> bool:
+        body = ",\n".join(geoFeature(self.__glider, *point) for point in points)
+        self.__qEmpty = not points
+        return self.__doc.write(self.HEAD, body, self.TAIL)
+
+    def append(self, points:list) -> None:
+        body = ",\n".join(geoFeature(self.__glider, *point) for point in points)
+        self.__doc.append(body if self.__qEmpty else ",\n" + body, self.TAIL)
+        self.__qEmpty = False
+
+class KMLTrack:
+    def __init__(self, directory:str, glider:str) -> None:
+        self.__glider = glider
+        self.__doc = Document(os.path.join(directory, glider + ".kml"))
+
+    @property
+    def filename(self) -> str:
+        return self.__doc.filename
+
+    def __tail(self, point:tuple) -> str:
+        # The latest fix placemark follows the track, so it is part of the tail
+        return "</coordinates></LineString></Placemark>\n" \
+                + kmlPlacemark(self.__glider, *point) \
+                + "</Document></kml>\n"
+
+    @staticmethod
+    def __body(points:list) -> str:
+        return "".join(f"{lon:.7f},{lat:.7f},0\n" for (t, lat, lon) in points)
+
+    def write(self, points:list) -> bool:
+        name = escape(self.__glider)
+        head = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                + '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>' \
+                + f"<name>{name}</name>\n" \
+                + f"<Placemark><name>{name} track</name><LineString><tessellate>1</tessellate><coordinates>\n"
+        if points:
+            tail = self.__tail(points[-1])
+        else:
+            tail = "</coordinates></LineString></Placemark>\n</Document></kml>\n"
+        return self.__doc.write(head, self.__body(points), tail)
+
+    def append(self, points:list) -> None:
+        self.__doc.append(self.__body(points), self.__tail(points[-1]))
+
+class TrackProducts(Thread):
+    def __init__(self, args:ArgumentParser, sendTo:list) -> None:
+        Thread.__init__(self, "Products", args)
+        self.__sendTo = sendTo
+        self.__queue = PolicyQueue("Products", "product", args.productQueue, "block")
+        self.__points = {} # glider -> [(time, lat, lon), ...], only recent ones without decimation
+        self.__tracks = {} # glider -> (GeoJSONTrack, KMLTrack)
+        self.__pending = {} # glider -> [(time, lat, lon), ...] not yet written
+        self.__tFirst = None # When the oldest pending fix arrived
+        self.__tRebuilt = None
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> ArgumentParser:
+        grp = parser.add_argument_group(description="Track product options")
+        grp.add_argument("--productDir", type=str,
+                help="Where to write GeoJSON and KML tracks, which are sent instead of the CSVs")
+        grp.add_argument("--productInterval", type=float, default=10,
+                help="Seconds to collect fixes before updating the products")
+        grp.add_argument("--productDecimate", type=float, default=0,
+                help="Seconds between the old fixes kept in the products, 0 keeps every fix")
+        grp.add_argument("--productDecimateAge", type=float, default=86400,
+                help="Seconds after which fixes are old, and between product rebuilds")
+        grp.add_argument("--productQueue", type=int, default=10000,
+                help="Fixes waiting to be added to the products")
+        return parser
+
+    def put(self, glider:str, t:float, lat:float, lon:float) -> None:
+        self.__queue.put((glider, t, lat, lon))
+
+    def load(self, names:list) -> None:
+        ''' Load the gliders' fixes from their CSVs, before any new fixes arrive '''
+        for glider in names:
+            self.__points[glider] = readCSV(os.path.join(self.args.csvDir, glider + ".csv"))
+
+    def __history(self, glider:str) -> list:
+        ''' Every fix kept for glider '''
+        points = self.__points.get(glider, [])
+        if self.args.productDecimate > 0: return points
+        # Recent fixes may not have been written to the CSV yet
+        return merge(readCSV(os.path.join(self.args.csvDir, glider + ".csv")), points)
+
+    def __keep(self, glider:str, points:list) -> None:
+        ''' Remember points, only recent ones without decimation, so memory is bounded '''
+        if self.args.productDecimate <= 0 and points:
+            tOld = points[-1][0] - self.args.productDecimateAge
+            points = points[bisect.bisect_left(points, (tOld,)):]
+        self.__points[glider] = points
+
+    def __send(self, filenames:list) -> None:
+        for fn in filenames:
+            for tgt in self.__sendTo:
+                tgt.put(fn)
+
+    def __track(self, glider:str) -> tuple:
+        if glider not in self.__tracks:
+            directory = self.args.productDir
+            self.__tracks[glider] = (GeoJSONTrack(directory, glider), KMLTrack(directory, glider))
+        return self.__tracks[glider]
+
+    def __fleet(self) -> list:
+        ''' Rewrite the fleet documents, returns the filenames which changed '''
+        directory = self.args.productDir
+        latest = [(glider, self.__points[glider][-1]) \
+                for glider in sorted(self.__points) if self.__points[glider]]
+
+        features = [geoFeature(glider, *point) for (glider, point) in latest]
+        filenames = []
+        geo = Document(os.path.join(directory, "fleet.geojson"))
+        if geo.write(GeoJSONTrack.HEAD, ",\n".join(features), GeoJSONTrack.TAIL):
+            filenames.append(geo.filename)
+
+        body = []
+        for (glider, point) in latest:
+            body.append(kmlPlacemark(glider, *point))
+            body.append(f"<NetworkLink><name>{escape(glider)} track</name>"
+                    + f"<Link><href>{escape(glider)}.kml</href></Link></NetworkLink>\n")
+        kml = Document(os.path.join(directory, "fleet.kml"))
+        if kml.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                + '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>fleet</name>\n',
+                "".join(body), "</Document></kml>\n"):
+            filenames.append(kml.filename)
+        return filenames
+
+    def __rebuild(self) -> None:
+        ''' Rewrite every document, decimating old fixes '''
+        args = self.args
+        t0 = time.time()
+        tOld = t0 - args.productDecimateAge
+        filenames = []
+        for glider in sorted(self.__points):
+            points = decimate(self.__points[glider], tOld, args.productDecimate)
+            for track in self.__track(glider):
+                if track.write(points): filenames.append(track.filename)
+            self.__keep(glider, points)
+        filenames.extend(self.__fleet())
+        self.__tRebuilt = t0
+        logging.info("Rebuilt products for %s gliders in %.3f seconds",
+                len(self.__points), time.time() - t0)
+        self.__send(filenames)
+
+    def __update(self) -> None:
+        ''' Append the pending fixes '''
+        filenames = []
+        for (glider, points) in self.__pending.items():
+            points.sort()
+            known = self.__points.get(glider)
+            if glider in self.__tracks and (not known or points[0][0] > known[-1][0]):
+                for track in self.__track(glider):
+                    track.append(points)
+                    filenames.append(track.filename)
+                self.__keep(glider, (known or []) + points)
+                continue
+            # Not loaded at startup, or a fix before the end of the track
+            points = merge(self.__history(glider), points)
+            for track in self.__track(glider):
+                if track.write(points): filenames.append(track.filename)
+            self.__keep(glider, points)
+        filenames.extend(self.__fleet())
+        logging.debug("Added %s fixes", sum(len(points) for points in self.__pending.values()))
+        self.__pending = {}
+        self.__tFirst = None
+        self.__send(filenames)
+
+    def __timeout(self) -> float:
+        if self.__tFirst is None: return None
+        return max(0, self.__tFirst + self.args.productInterval - time.time())
+
+    def runIt(self): # Called on start
+        args = self.args
+        if not os.path.isdir(args.productDir):
+            logging.info("Creating %s", args.productDir)
+            os.makedirs(args.productDir, mode=0o755, exist_ok=True)
+
+        self.__rebuild()
+
+        q = self.__queue
+        while True:
+            try:
+                (glider, t, lat, lon) = q.get(timeout=self.__timeout())
+                q.task_done()
+                if self.__tFirst is None: self.__tFirst = time.time()
+                self.__pending.setdefault(glider, []).append((t, lat, lon))
+            except queue.Empty:
+                pass
+            if self.__pending and self.__timeout() == 0:
+                if args.productDecimate > 0 \
+                        and time.time() - self.__tRebuilt >= args.productDecimateAge:
+                    for (glider, points) in self.__pending.items():
+                        self.__points[glider] = merge(self.__points.get(glider, []), points)
+                    self.__pending = {}
+                    self.__tFirst = None
+                    self.__rebuild()
+                else:
+                    self.__update()
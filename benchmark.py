@@ -0,0 +1,188 @@
+#! /usr/bin/env python3
+#
+# Measure how fast dialog goes through ParseDialog and Sensors
+#
+#  parse   lines/sec through ParseDialog's line dispatcher, with sensor and
+#          download requests counted and discarded
+#  fixes   fixes/sec written into the position CSV
+#  sensors Sensors record write latency as the NetCDF file grows, with every
+#          record flushed to the file
+#
+# Each is run --runs times and the median of each result is reported, since
+# single runs vary by 20% or more.
+#
+# The dialog is recorded dialog file(s) or, without any, synthetic dialog
+# from SynthDialog. Output goes to a temporary directory.
+#
+# Results can be saved as a baseline, --save, and later runs compared to it,
+# --compare, which exits with a failure if any rate dropped, or the median
+# latency grew, by more than --tolerance.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import logging
+import json
+import sys
+import time
+import numpy as np
+from tempfile import TemporaryDirectory
+from TPWUtils import Logger
+from ParseDialog import ParseDialog
+from PolicyQueue import PolicyQueue
+from Sensors import Sensors
+import SynthDialog
+
+class Discard:
+    ''' Stand in for Sensors, DownloadFiles, and SendToTarget which counts requests '''
+    def __init__(self) -> None:
+        self.nPut = 0
+        self.nDevices = 0
+
+    def put(self, *args, **kwargs) -> None:
+        self.nPut += 1
+
+    def devices(self) -> None:
+        self.nDevices += 1
+
+def loadDialog(filenames:list) -> list:
+    lines = []
+    for fn in filenames:
+        with open(fn, "rb") as fp:
+            lines.extend(fp.readlines())
+    return lines
+
+def benchParse(args:ArgumentParser, lines:list) -> dict:
+    sensors = Discard()
+    download = Discard()
+    sendTo = [Discard()]
+    with TemporaryDirectory() as csvDir:
+        args.csvDir = csvDir
+        pd = ParseDialog(args.glider, args, sendTo, sensors, download)
+        process = pd.process
+        t0 = time.perf_counter()
+        for cnt in range(args.repeat):
+            for line in lines:
+                process(line)
+        dt = time.perf_counter() - t0
+    n = len(lines) * args.repeat
+    return dict(
+            lines=n,
+            seconds=dt,
+            linesPerSecond=n / dt if dt > 0 else None,
+            fixes=sendTo[0].nPut,
+            fixesPerSecond=sendTo[0].nPut / dt if dt > 0 else None,
+            sensors=sensors.nPut,
+            devices=sensors.nDevices,
+            zModem=download.nPut,
+            )
+
+def benchSensors(args:ArgumentParser) -> dict:
+    ''' Write latency of each sensor record as the file grows '''
+    args.sensorFlushCount = 1 # Otherwise most writes only append to the buffer
+    args.sensorFlushInterval = 0
+    rng = np.random.default_rng(args.seed)
+    names = [(f"m_sensor{i}", "nodim") for i in range(args.nSensors)]
+    latency = np.zeros(args.records)
+    with TemporaryDirectory() as sensorDir:
+        args.sensorDir = sensorDir
+        sensors = Sensors(args.glider, args, [])
+        sensors.prepare()
+        t = 1.7e9
+        for index in range(args.records):
+            t += 3600
+            for (name, units) in names:
+                sensors.update(name, units, rng.uniform(-100, 100), t)
+            t0 = time.perf_counter()
+            sensors.write(*sensors.record())
+            latency[index] = time.perf_counter() - t0
+        sensors.close()
+    # Mean latency per tenth of the records, to show growth with file size
+    tenths = [float(np.mean(chunk)) for chunk in np.array_split(latency, 10) if chunk.size]
+    return dict(
+            records=args.records,
+            recordsPerSecond=args.records / latency.sum() if latency.sum() > 0 else None,
+            latencyMedian=float(np.median(latency)),
+            latency99=float(np.percentile(latency, 99)),
+            latencyFirstTenth=tenths[0],
+            latencyLastTenth=tenths[-1],
+            )
+
+def median(runs:list) -> dict:
+    ''' Median of each float result over the runs '''
+    results = dict(runs[0])
+    for key in results:
+        vals = [run[key] for run in runs]
+        if all(isinstance(val, float) for val in vals): results[key] = float(np.median(vals))
+    return results
+
+def compare(results:dict, baseline:dict, tolerance:float) -> bool:
+    ''' Print results against the baseline, returns False if a rate regressed '''
+    qOkay = True
+    for section in results:
+        for key in results[section]:
+            val = results[section][key]
+            ref = baseline.get(section, {}).get(key)
+            if not isinstance(val, float) or not isinstance(ref, float) or not ref: continue
+            change = val / ref - 1
+            # Rates should not drop, the median latency should not grow,
+            # tail latencies are too noisy to judge
+            qRate = key.endswith("PerSecond")
+            qLatency = key == "latencyMedian"
+            flag = ""
+            if (qRate and change < -tolerance) or (qLatency and change > tolerance):
+                flag = " REGRESSION"
+                qOkay = False
+            print(f"{section} {key} {val:.6g} baseline {ref:.6g} {100 * change:+.1f}%{flag}")
+    return qOkay
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("dialog", type=str, nargs="*",
+            help="Recorded dialog file(s), synthetic dialog if none")
+    parser.add_argument("--glider", type=str, default="bench", help="Name of glider")
+    parser.add_argument("--repeat", type=int, default=10,
+            help="Number of times to run through the dialog")
+    parser.add_argument("--records", type=int, default=2000,
+            help="Number of sensor records to write")
+    parser.add_argument("--save", type=str, help="Save the results to this JSON file")
+    parser.add_argument("--compare", type=str, help="Compare the results to this JSON file")
+    parser.add_argument("--runs", type=int, default=5,
+            help="Number of times to run each benchmark, the median is reported")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+            help="Fractional change allowed before --compare reports a regression")
+    Logger.addArgs(parser)
+    ParseDialog.addArgs(parser)
+    Sensors.addArgs(parser)
+    PolicyQueue.addArgs(parser)
+    SynthDialog.addArgs(parser)
+    args = parser.parse_args()
+
+    Logger.mkLogger(args, logLevel=logging.WARNING)
+
+    if args.dialog:
+        lines = loadDialog(args.dialog)
+    else:
+        lines = list(SynthDialog.fromArgs(args))
+
+    runs = max(1, args.runs)
+    results = dict(
+            parse=median([benchParse(args, lines) for cnt in range(runs)]),
+            sensors=median([benchSensors(args) for cnt in range(runs)]),
+            )
+
+    info = results["parse"]
+    print("Parsed {lines} lines in {seconds:.3f} seconds, {linesPerSecond:.0f} lines/sec".format(**info))
+    print("fixes {fixes} {fixesPerSecond:.0f}/sec sensors {sensors} devices {devices} zModem {zModem}".format(**info))
+    info = results["sensors"]
+    print("Wrote {records} sensor records, {recordsPerSecond:.0f}/sec".format(**info))
+    print("latency median {latencyMedian:.6f} 99% {latency99:.6f} first tenth {latencyFirstTenth:.6f} last tenth {latencyLastTenth:.6f}".format(**info))
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as fp:
+            baseline = json.load(fp)
+        if not compare(results, baseline, args.tolerance): sys.exit(1)
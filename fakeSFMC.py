@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+#
+# Local stand-in for node plus the sfmc-rest-programs scripts, for load testing
+#
+# Use it as the node command, --node=./fakeSFMC.py. It is called as
+#   fakeSFMC.py /path/script.js args...
+# and dispatches on the script's basename:
+#   output_glider_dialog_data.js glider
+#       streams synthetic dialog, a surfacing every SFMC_FAKE_SURFACE seconds,
+#       with Curr Time: the wall clock time it was written
+#   get_glider_folder_listing.js glider folder page
+#       a JSON page, newest first, of the files the glider has sent so far
+#   download_glider_files.js glider folder pattern since fnZip
+#       a zip of the files modified since since, YYYYmmddHHMM
+#   sfmc_worker.js
+#       the NodeWorker JSON lines protocol, running the above in process
+#
+# Behaviour is set by environment variables
+#   SFMC_FAKE_LATENCY  mean seconds added to each API call, 0
+#   SFMC_FAKE_FAILURE  probability an API call fails, or a dialog stream drops
+#                      at each surfacing, 0
+#   SFMC_FAKE_SURFACE  seconds between surfacings, 60
+#   SFMC_FAKE_SENSORS  sensors per devices: block, 20
+#   SFMC_FAKE_FILES    seconds between files sent by each glider, 300
+#   SFMC_FAKE_SIZE     bytes per file, 4096
+#   SFMC_FAKE_PAGE     files per listing page, 10
+#   SFMC_FAKE_T0       UNIX time files started being sent, now - 1 day
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from datetime import datetime, timezone
+import threading
+import zipfile
+import random
+import json
+import time
+import zlib
+import sys
+import os
+import SynthDialog
+
+def env(name:str, default:float) -> float:
+    return float(os.environ.get("SFMC_FAKE_" + name, default))
+
+LATENCY = env("LATENCY", 0)
+FAILURE = env("FAILURE", 0)
+SURFACE = env("SURFACE", 60)
+SENSORS = int(env("SENSORS", 20))
+FILES = env("FILES", 300)
+SIZE = int(env("SIZE", 4096))
+PAGE = int(env("PAGE", 10))
+T0 = env("T0", time.time() - 86400)
+
+class Failure(Exception):
+    pass
+
+def apiCall() -> None:
+    ''' Simulated network latency and failures '''
+    if LATENCY > 0: time.sleep(random.uniform(0, 2 * LATENCY))
+    if random.random() < FAILURE: raise Failure("Simulated SFMC failure")
+
+def gliderFiles(glider:str) -> list:
+    ''' [(name, mtime), ...] of the files glider has sent so far, newest first '''
+    seed = zlib.crc32(bytes(glider, "utf-8"))
+    offset = seed % max(1, int(FILES)) # Stagger the gliders
+    n = max(0, int((time.time() - T0 - offset) // FILES))
+    files = []
+    for index in range(n):
+        files.append((f"{seed % 10000:04d}{index:04d}.{'sbd' if index % 2 else 'tbd'}",
+            int(T0 + offset + index * FILES)))
+    files.reverse()
+    return files
+
+def listing(glider:str, folder:str, page:str) -> str:
+    apiCall()
+    files = gliderFiles(glider)
+    page = int(page)
+    results = []
+    for (name, mtime) in files[page * PAGE:(page + 1) * PAGE]:
+        results.append(dict(fileName=name, fileSize=SIZE,
+            dateTimeModified=datetime.fromtimestamp(mtime, tz=timezone.utc) \
+                    .strftime("%Y-%m-%d %H:%M:%S")))
+    links = dict(self=page)
+    if (page + 1) * PAGE < len(files): links["next"] = page + 1
+    return json.dumps(dict(results=results, links=links))
+
+def download(glider:str, folder:str, pattern:str, since:str, fnZip:str) -> str:
+    apiCall()
+    t0 = datetime.strptime(since, "%Y%m%d%H%M").replace(tzinfo=timezone.utc).timestamp()
+    with zipfile.ZipFile(fnZip, "w") as zip:
+        for (name, mtime) in gliderFiles(glider):
+            if mtime < t0: break
+            info = zipfile.ZipInfo(name,
+                    datetime.fromtimestamp(mtime, tz=timezone.utc).timetuple()[:6])
+            zip.writestr(info, random.Random(name).randbytes(SIZE))
+    return ""
+
+def dialog(glider:str) -> None:
+    ''' Stream dialog until killed, or a simulated drop '''
+    out = sys.stdout.buffer
+    rng = random.Random(glider)
+    time.sleep(rng.uniform(0, SURFACE)) # Stagger the gliders
+    seed = rng.randrange(2**31)
+    while True:
+        now = datetime.now(tz=timezone.utc).replace(microsecond=0)
+        seed += 1
+        out.writelines(SynthDialog.generate(1, nSensors=SENSORS, nFixes=1, t0=now, seed=seed))
+        out.flush()
+        if random.random() < FAILURE: return
+        time.sleep(SURFACE)
+
+def run(script:str, argv:list) -> tuple:
+    ''' Run an API script, returns (returncode, stdout, stderr) '''
+    name = os.path.basename(script)
+    try:
+        if name == "get_glider_folder_listing.js": return (0, listing(*argv), "")
+        if name == "download_glider_files.js": return (0, download(*argv), "")
+    except Failure as e:
+        return (1, "", str(e))
+    return (1, "", f"Unknown script {script}")
+
+def worker() -> None:
+    ''' NodeWorker's JSON lines protocol, each request is handled in its own thread '''
+    lock = threading.Lock()
+
+    def handle(req:dict) -> None:
+        (rc, stdout, stderr) = run(req["script"], req.get("args", []))
+        msg = json.dumps(dict(id=req["id"], returncode=rc, stdout=stdout, stderr=stderr))
+        with lock:
+            sys.stdout.write(msg + "\n")
+            sys.stdout.flush()
+
+    for line in sys.stdin:
+        if not line.strip(): continue
+        threading.Thread(target=handle, args=(json.loads(line),), daemon=True).start()
+
+    for thrd in threading.enumerate(): # Finish outstanding requests
+        if thrd is not threading.current_thread(): thrd.join()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2: sys.exit("Usage: fakeSFMC.py script.js args...")
+    name = os.path.basename(sys.argv[1])
+    try:
+        if name == "output_glider_dialog_data.js":
+            dialog(sys.argv[2])
+        elif name == "sfmc_worker.js":
+            worker()
+        else:
+            (rc, stdout, stderr) = run(sys.argv[1], sys.argv[2:])
+            sys.stdout.write(stdout)
+            sys.stderr.write(stderr)
+            sys.exit(rc)
+    except (BrokenPipeError, KeyboardInterrupt): # The harvester went away
+        sys.exit(0)
@@ -0,0 +1,202 @@
+#! /usr/bin/env python3
+#
+# End to end load test of monitor.py against fakeSFMC.py
+#
+# Runs monitor.py for N simulated gliders, with rsync to a local directory,
+# for --duration seconds and reports
+#  - throughput, dialog lines, fixes, and files per second, from the metrics endpoint
+#  - memory, RSS, and thread count of monitor.py and any shards, from /proc
+#  - fix to delivery latency, from when a fix's Curr Time: was written by
+#    fakeSFMC.py to when its row shows up in the delivered CSV
+#
+# Arguments after -- are passed on to monitor.py, e.g.
+#   ./loadTest.py --gliders=100 --duration=600 -- --engine=asyncio --shards=4
+# The SFMC API rate limit, --sfmcRate, applies to the stand-in too.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+import urllib.request
+import subprocess
+import signal
+import json
+import time
+import sys
+import os
+import numpy as np
+
+def procTree(pid:int) -> list:
+    ''' pid and all its descendants '''
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit(): continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as fp:
+                ppid = int(fp.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(name))
+        except (OSError, IndexError, ValueError):
+            pass
+    pids = [pid]
+    for item in pids:
+        pids.extend(children.get(item, []))
+    return pids
+
+def harvesterUsage(pid:int) -> tuple:
+    ''' (RSS bytes, threads) summed over monitor.py, pid, and its shard processes '''
+    rss = 0
+    threads = 0
+    for item in procTree(pid):
+        try:
+            if item != pid:
+                with open(f"/proc/{item}/cmdline", "rb") as fp:
+                    if b"multiprocessing" not in fp.read(): continue # Not a shard
+            with open(f"/proc/{item}/status", "r") as fp:
+                status = dict(line.split(":", 1) for line in fp if ":" in line)
+            rss += int(status["VmRSS"].split()[0]) * 1024
+            threads += int(status["Threads"])
+        except (OSError, KeyError, ValueError):
+            pass
+    return (rss, threads)
+
+def scrape(port:int) -> dict:
+    ''' event -> total over all owners from monitor.py's metrics endpoint '''
+    totals = {}
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as fp:
+            for line in fp:
+                line = str(line, "utf-8")
+                if not line.startswith("sfmc_events_total"): continue
+                (labels, val) = line.rsplit(" ", 1)
+                event = labels.split('event="', 1)[1].split('"', 1)[0]
+                totals[event] = totals.get(event, 0) + float(val)
+    except OSError:
+        pass
+    return totals
+
+class Deliveries:
+    ''' Watch delivered CSVs for new rows '''
+    def __init__(self, directory:str) -> None:
+        self.__dir = directory
+        self.__offsets = {}
+        self.latency = []
+
+    def poll(self) -> None:
+        now = time.time()
+        if not os.path.isdir(self.__dir): return
+        for name in os.listdir(self.__dir):
+            if not name.endswith(".csv"): continue
+            fn = os.path.join(self.__dir, name)
+            offset = self.__offsets.get(name, 0)
+            try:
+                with open(fn, "rb") as fp:
+                    fp.seek(offset)
+                    data = fp.read()
+            except OSError:
+                continue
+            data = data[:data.rfind(b"\n") + 1] # Only whole rows
+            self.__offsets[name] = offset + len(data)
+            for row in data.splitlines():
+                fields = row.split(b",")
+                if not fields[0].isdigit(): continue # Header
+                self.latency.append(now - int(fields[0]))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Load test monitor.py against a stand-in SFMC API")
+    parser.add_argument("--gliders", type=int, default=10, help="Number of simulated gliders")
+    parser.add_argument("--duration", type=float, default=300, help="Seconds to run for")
+    parser.add_argument("--surface", type=float, default=120,
+            help="Seconds between surfacings, fixes within 60 seconds of the last are not written")
+    parser.add_argument("--sensors", type=int, default=20, help="Sensors per surfacing")
+    parser.add_argument("--files", type=float, default=300, help="Seconds between files per glider")
+    parser.add_argument("--latency", type=float, default=0, help="Mean SFMC API latency in seconds")
+    parser.add_argument("--failure", type=float, default=0, help="Probability an SFMC call fails")
+    parser.add_argument("--rsync", type=str, default="/usr/bin/rsync", help="rsync command to use")
+    parser.add_argument("--metricsPort", type=int, default=9199, help="Port for monitor.py's metrics")
+    parser.add_argument("--workdir", type=str, help="Where to run, a temporary directory if not given")
+    parser.add_argument("--output", type=str, help="Write the report as JSON to this file")
+    (args, extra) = parser.parse_known_args()
+    if extra and extra[0] == "--": extra = extra[1:]
+
+    home = os.path.dirname(os.path.abspath(__file__))
+
+    with TemporaryDirectory() as tempDir:
+        workdir = os.path.abspath(args.workdir or tempDir)
+        dst = os.path.join(workdir, "delivered")
+        os.makedirs(dst, exist_ok=True)
+
+        env = dict(os.environ)
+        env.update(
+                SFMC_FAKE_SURFACE=str(args.surface),
+                SFMC_FAKE_SENSORS=str(args.sensors),
+                SFMC_FAKE_FILES=str(args.files),
+                SFMC_FAKE_LATENCY=str(args.latency),
+                SFMC_FAKE_FAILURE=str(args.failure),
+                SFMC_FAKE_T0=str(time.time() - 3600),
+                )
+
+        gliders = [f"sim{index:03d}" for index in range(args.gliders)]
+        cmd = [sys.executable, os.path.join(home, "monitor.py"), *gliders,
+                "--node", os.path.join(home, "fakeSFMC.py"),
+                "--API", os.path.join(workdir, "api"),
+                "--reconnect", "1000000",
+                "--downloadDelay", "10",
+                "--csvDir", os.path.join(workdir, "CSV"),
+                "--sensorDir", os.path.join(workdir, "sensors"),
+                "--stateDir", os.path.join(workdir, "state"),
+                "--hostname", dst,
+                "--rsync", args.rsync,
+                "--metricsPort", str(args.metricsPort),
+                "--statsInterval", "5", # How often shards report their counters
+                "--logfile", os.path.join(workdir, "monitor.log"),
+                *extra,
+                ]
+        print("Running", " ".join(cmd))
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env)
+
+        deliveries = Deliveries(dst)
+        usage = []
+        t0 = time.time()
+        try:
+            while time.time() - t0 < args.duration and proc.poll() is None:
+                time.sleep(1)
+                usage.append(harvesterUsage(proc.pid))
+                deliveries.poll()
+            counts = scrape(args.metricsPort)
+        finally:
+            dt = time.time() - t0
+            pids = procTree(proc.pid)
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            for pid in pids[1:]: # Dialog streams only notice on their next write
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    latency = np.array(deliveries.latency)
+    rss = np.array([item[0] for item in usage]) if usage else np.zeros(1)
+    threads = np.array([item[1] for item in usage]) if usage else np.zeros(1)
+    report = dict(
+            gliders=args.gliders,
+            seconds=dt,
+            linesPerSecond=counts.get("lines", 0) / dt,
+            fixesPerSecond=counts.get("fixes", 0) / dt,
+            filesPerSecond=counts.get("downloadFiles", 0) / dt,
+            rsyncFailures=counts.get("rsyncFailures", 0),
+            rssMaxMB=float(rss.max()) / 2**20,
+            rssFinalMB=float(rss[-1]) / 2**20,
+            threadsMax=int(threads.max()),
+            deliveries=int(latency.size),
+            latencyMedian=float(np.median(latency)) if latency.size else None,
+            latency95=float(np.percentile(latency, 95)) if latency.size else None,
+            latencyMax=float(latency.max()) if latency.size else None,
+            )
+    for key in report:
+        print(f"{key} {report[key]}")
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
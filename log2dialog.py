@@ -1,35 +1,113 @@
 #! /usr/bin/env python3
 #
-# Go through an output log and pull out the dialog lines for replaying
+# Go through output logs and pull out the dialog lines for replaying
+#
+# The logs may be a rotated set, harvest.log harvest.log.1 ..., and any may be
+# gzipped. They are put in time order by their first timestamp. Each log is
+# split by glider in its own process, into temporary files which are then
+# concatenated in order.
+#
+# Dialog lines are only logged with --trace=1, and are written as
+#   time glider INFO: Line b'...'         threads engine
+#   time Async INFO: Line glider b'...'   asyncio engine
+# The repr of the line is decoded back to the exact original bytes.
+#
+# An --archiveDir archive is cheaper to extract from, see DialogArchive.py
 #
 # Jan-2025, Pat Welch, pat@mousebrains.com
 
 from argparse import ArgumentParser
-import re
-import os.path
-
-parser = ArgumentParser()
-parser.add_argument("logfile", type=str, help="Input logfile name")
-parser.add_argument("--glider", type=str, action="append", help="Which glider(s) to filter on")
-parser.add_argument("--outdir", type=str, default=".", help="Where to write output to")
-args = parser.parse_args()
-
-ofp = {}
-with open(args.logfile, "rb") as ifp:
-    for line in ifp:
-        if b" INFO: Line b'" not in line: continue
-        if b" PD:" in line: continue
-        line = line.strip()
-        fields = line.split()
-        if len(fields) < 6: continue
-        glider = str(fields[2], "utf-8")
-        if args.glider and glider not in args.glider: continue
-        fields = line.split(b" b'")
-        if len(fields) != 2: continue
-        fields = fields[1][:-5]
-        if glider not in ofp:
-            ofp[glider] = open(os.path.join(args.outdir, glider + ".dialog"), "wb")
-        ofp[glider].write(fields + b"\r\n")
-
-for glider in ofp:
-    ofp[glider].close()
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+import shutil
+import gzip
+import os
+
+marker = b" INFO: Line "
+
+def openLog(fn:str):
+    return gzip.open(fn, "rb") if fn.endswith(".gz") else open(fn, "rb")
+
+def logOrder(fn:str) -> tuple:
+    ''' Sort key, the first line's timestamp, then older rotations, log.2 before log.1 '''
+    with openLog(fn) as fp:
+        t = fp.readline()[:23] # YYYY-mm-dd HH:MM:SS,mmm
+    suffix = fn[:-3] if fn.endswith(".gz") else fn
+    suffix = suffix.rsplit(".", 1)[-1]
+    return (t, -int(suffix) if suffix.isdigit() else 0)
+
+def normTime(val:str) -> bytes:
+    ''' ISO 8601 to the logs' YYYY-mm-dd HH:MM:SS, for prefix comparison '''
+    return bytes(val.replace("T", " "), "utf-8")
+
+def splitLog(fn:str, index:int, args:ArgumentParser) -> list:
+    ''' Split fn into per glider temporary files, returns the gliders found '''
+    gliders = set(args.glider) if args.glider else None
+    start = normTime(args.start) if args.start else None
+    stop = normTime(args.stop) if args.stop else None
+    ofp = {}
+    try:
+        with openLog(fn) as ifp:
+            for line in ifp:
+                i = line.find(marker) # Cheap test before any splitting
+                if i < 0: continue
+                if start is not None and line[:len(start)] < start: continue
+                if stop is not None and line[:len(stop)] > stop: break
+                rest = line[i + len(marker):].rstrip(b"\r\n")
+                if rest[:2] in (b"b'", b'b"'):
+                    glider = line[24:i] # Thread name after the timestamp
+                else:
+                    (glider, rest) = rest.split(b" ", 1)
+                if b":" in glider: continue # Older logs repeat the lines from PD:glider threads
+                if len(rest) < 3 or rest[-1] != rest[1]: continue # Not a complete repr
+                glider = str(glider, "utf-8")
+                if gliders is not None and glider not in gliders: continue
+                if glider not in ofp:
+                    ofp[glider] = open(tempName(args.outdir, index, glider), "wb")
+                ofp[glider].write(codecs.escape_decode(rest[2:-1])[0])
+    finally:
+        for glider in ofp:
+            ofp[glider].close()
+    return list(ofp)
+
+def tempName(outdir:str, index:int, glider:str) -> str:
+    return os.path.join(outdir, f".log2dialog.{index}.{glider}")
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("logfile", type=str, nargs="+", help="Input logfile name(s), may be gzipped")
+    parser.add_argument("--glider", type=str, action="append", help="Which glider(s) to filter on")
+    parser.add_argument("--outdir", type=str, default=".", help="Where to write output to")
+    parser.add_argument("--start", type=str, help="Earliest log time, YYYY-mm-dd HH:MM:SS")
+    parser.add_argument("--stop", type=str, help="Latest log time, YYYY-mm-dd HH:MM:SS")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+            help="Number of logs to split at once")
+    args = parser.parse_args()
+
+    logs = sorted(logOrder(fn) + (fn,) for fn in args.logfile)
+
+    # Skip logs wholly outside of the time window
+    start = normTime(args.start) if args.start else None
+    stop = normTime(args.stop) if args.stop else None
+    selected = []
+    for (index, (t, rotation, fn)) in enumerate(logs):
+        if stop and t[:len(stop)] > stop: break
+        if start and index + 1 < len(logs) and logs[index + 1][0] <= start: continue
+        selected.append(fn)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(selected) or 1))) as pool:
+        futures = [pool.submit(splitLog, fn, index, args) for (index, fn) in enumerate(selected)]
+        results = [future.result() for future in futures]
+
+    ofp = {}
+    for (index, gliders) in enumerate(results):
+        for glider in gliders:
+            if glider not in ofp:
+                ofp[glider] = open(os.path.join(args.outdir, glider + ".dialog"), "wb")
+            ifn = tempName(args.outdir, index, glider)
+            with open(ifn, "rb") as ifp:
+                shutil.copyfileobj(ifp, ofp[glider])
+            os.unlink(ifn)
+
+    for glider in ofp:
+        ofp[glider].close()
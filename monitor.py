@@ -12,44 +12,102 @@ from argparse import ArgumentParser
 import subprocess
 import logging
 import os
+import signal
+import sys
 from TPWUtils import Logger
 from TPWUtils.Thread import Thread
 from SendTo import SendToTarget
-from ParseDialog import ParseDialog
+from ParseDialog import ParseDialog, addFixListener
 from Sensors import Sensors
+from Compact import Compactor
 from DownloadFiles import DownloadFiles
+from NodeWorker import NodeWorker
+from Scheduler import Scheduler
 from MonitorGlider import MonitorGlider
+from DialogArchive import DialogArchive
+from PolicyQueue import PolicyQueue
+from Stats import Stats
+from Metrics import Metrics
+from TrackIndex import TrackIndex, fix as trackFix
+from TrackProducts import TrackProducts
+from Profiler import Profiler
+from AsyncEngine import AsyncEngine
+from Supervisor import Supervisor, startGliders
+import State
 
-parser = ArgumentParser()
-parser.add_argument("glider", type=str, nargs="+", help="Name of glider(s) to monitor")
-Logger.addArgs(parser)
-SendToTarget.addArgs(parser)
-ParseDialog.addArgs(parser)
-Sensors.addArgs(parser)
-DownloadFiles.addArgs(parser)
-MonitorGlider.addArgs(parser)
-args = parser.parse_args()
-
-Logger.mkLogger(args, logLevel=logging.INFO)
-
-sendTo = []
-if args.hostname:
-    for tgt in args.hostname:
-        sendTo.append(SendToTarget(tgt, args))
-        sendTo[-1].start()
-
-threads = []
-for glider in args.glider:
-    sensors = Sensors(glider, args, sendTo)
-    sensors.start()
-    download = DownloadFiles(glider, args, sendTo)
-    download.start()
-    parser = ParseDialog(glider, args, sendTo, sensors, download)
-    parser.start()
-    threads.append(MonitorGlider(glider, args, parser))
-    threads[-1].start()
-
-try:
-    Thread.waitForException()
-except:
-    logging.exception("Unexpected termination")
+if __name__ == "__main__": # Shard processes import this module
+    parser = ArgumentParser()
+    parser.add_argument("glider", type=str, nargs="+", help="Name of glider(s) to monitor")
+    Logger.addArgs(parser)
+    SendToTarget.addArgs(parser)
+    ParseDialog.addArgs(parser)
+    Sensors.addArgs(parser)
+    Compactor.addArgs(parser)
+    State.addArgs(parser)
+    DownloadFiles.addArgs(parser)
+    NodeWorker.addArgs(parser)
+    Scheduler.addArgs(parser)
+    MonitorGlider.addArgs(parser)
+    DialogArchive.addArgs(parser)
+    PolicyQueue.addArgs(parser)
+    Stats.addArgs(parser)
+    Metrics.addArgs(parser)
+    TrackIndex.addArgs(parser)
+    TrackProducts.addArgs(parser)
+    Profiler.addArgs(parser)
+    AsyncEngine.addArgs(parser)
+    Supervisor.addArgs(parser)
+    args = parser.parse_args()
+
+    Logger.mkLogger(args, logLevel=logging.INFO)
+
+    def sigTerm(signum, frame) -> None:
+        # Turn systemd's SIGTERM into a normal exit so buffered output is flushed by atexit,
+        # a second SIGTERM kills us outright
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, sigTerm)
+
+    sendTo = []
+    if args.hostname:
+        for tgt in args.hostname:
+            sendTo.append(SendToTarget(tgt, args))
+            sendTo[-1].start()
+
+    stats = Stats(args)
+    stats.start()
+
+    if args.metricsPort > 0:
+        metrics = Metrics(args)
+        metrics.start()
+
+    if args.trackPort > 0:
+        tracks = TrackIndex(args)
+        tracks.load(args.glider) # Before any new fixes arrive
+        addFixListener(trackFix) # Shards forward their fixes to the supervisor
+        tracks.start()
+
+    if args.productDir:
+        products = TrackProducts(args, sendTo)
+        products.load(args.glider)
+        addFixListener(products.put)
+        products.start()
+
+    supervisor = None
+    if args.shards > 0: # Split the gliders across worker processes
+        supervisor = Supervisor(args, sendTo)
+        supervisor.start()
+    else:
+        startGliders(args, args.glider, sendTo)
+
+    profiler = Profiler(args) # SIGUSR1 dumps a profile, SIGUSR2 toggles profiling
+    profiler.installSignals(supervisor.signalShards if supervisor else None)
+    profiler.start()
+
+    try:
+        Thread.waitForException()
+    except SystemExit:
+        logging.info("Terminated")
+    except:
+        logging.exception("Unexpected termination")
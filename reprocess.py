@@ -0,0 +1,134 @@
+#! /usr/bin/env python3
+#
+# Rebuild the position CSV and sensor NetCDF files from recorded dialog
+#
+# The dialog goes through the same ParseDialog and Sensors code as the live
+# harvester, but synchronously, with no threads or queues, so it runs as
+# fast as the disk allows and exits when it is done. Each glider is
+# processed in its own process, so many gliders run in parallel.
+#
+# Dialog files may be plain, which are memory mapped, gzipped, or
+# DialogArchive archives, which are read only for the --start/--stop window.
+# The glider name is taken from --glider or from the file name,
+# glider.dialog as written by log2dialog.py or glider.dialog.gz.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import time
+import os
+from TPWUtils import Logger
+from ParseDialog import ParseDialog
+from PolicyQueue import PolicyQueue
+from Sensors import Sensors
+from PositionWriter import PositionWriter
+from Stats import counters
+from DialogArchive import readDialog, parseTime
+
+class DirectSensors:
+    ''' Sensors interface for ParseDialog which updates and writes in the caller's thread '''
+    def __init__(self, sensors:Sensors) -> None:
+        self.__sensors = sensors
+
+    def put(self, name:str, units:str, val:float, t:float) -> None:
+        self.__sensors.update(name, units, val, t)
+
+    def devices(self) -> None:
+        record = self.__sensors.record()
+        if record: self.__sensors.write(*record)
+
+class NoDownload:
+    ''' DownloadFiles interface for ParseDialog, there is nothing to harvest offline '''
+    def put(self) -> None:
+        pass
+
+def gliderName(fn:str) -> str:
+    ''' glider from path/glider.dialog[.gz] '''
+    name = os.path.basename(fn)
+    if name.endswith(".gz"): name = name[:-3]
+    return name.split(".")[0]
+
+def outputs(glider:str, args:ArgumentParser) -> list:
+    return PositionWriter.outputs(args.csvDir, glider) \
+            + [os.path.join(args.sensorDir, glider + ".sensors.nc")]
+
+def reprocess(glider:str, filenames:list, args:ArgumentParser) -> dict:
+    ''' Parse filenames in order for glider, returns the counters '''
+    if args.clobber:
+        for fn in outputs(glider, args):
+            if os.path.exists(fn):
+                logging.info("Removing %s", fn)
+                os.unlink(fn)
+
+    sensors = Sensors(glider, args, [])
+    sensors.prepare()
+    parser = ParseDialog(glider, args, [], DirectSensors(sensors), NoDownload())
+    parser.prepare()
+    process = parser.process
+
+    t0 = time.time()
+    try:
+        for fn in filenames:
+            logging.info("Reading %s", fn)
+            for line in readDialog(fn, args.start, args.stop):
+                process(line)
+    finally:
+        parser.close()
+        sensors.close()
+    cnts = dict(counters(glider))
+    cnts["seconds"] = time.time() - t0
+    return cnts
+
+def initWorker(args:ArgumentParser) -> None:
+    Logger.mkLogger(args, logLevel=logging.WARNING)
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("dialog", type=str, nargs="+", help="Dialog file(s) to reprocess")
+    parser.add_argument("--glider", type=str,
+            help="Name of glider for all the files, otherwise taken from each file name")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+            help="Number of gliders to process at once")
+    parser.add_argument("--clobber", action="store_true",
+            help="Remove existing CSV and NetCDF files before reprocessing")
+    parser.add_argument("--start", type=str,
+            help="Earliest glider time to reprocess from archives, ISO 8601 or UNIX seconds")
+    parser.add_argument("--stop", type=str,
+            help="Latest glider time to reprocess from archives, ISO 8601 or UNIX seconds")
+    Logger.addArgs(parser)
+    ParseDialog.addArgs(parser)
+    PolicyQueue.addArgs(parser)
+    Sensors.addArgs(parser)
+    args = parser.parse_args()
+
+    Logger.mkLogger(args, logLevel=logging.WARNING)
+
+    if args.start is not None: args.start = parseTime(args.start)
+    if args.stop is not None: args.stop = parseTime(args.stop)
+
+    gliders = {} # Files in the order given, per glider
+    for fn in args.dialog:
+        glider = args.glider or gliderName(fn)
+        gliders.setdefault(glider, []).append(fn)
+
+    # Existing output would be appended to, so a glider without --clobber may double up
+    for glider in gliders:
+        for fn in outputs(glider, args):
+            if not args.clobber and os.path.exists(fn):
+                logging.warning("Appending to existing %s, use --clobber to start over", fn)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(gliders))),
+            initializer=initWorker, initargs=(args,)) as pool:
+        futures = {glider: pool.submit(reprocess, glider, gliders[glider], args) \
+                for glider in gliders}
+        failed = False
+        for glider in futures:
+            try:
+                cnts = futures[glider].result()
+                print(glider, " ".join(f"{key} {cnts[key]:.6g}" for key in sorted(cnts)))
+            except:
+                logging.exception("Reprocessing %s", glider)
+                failed = True
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,87 @@
+#!/usr/bin/env node
+//
+// Long-lived node worker for NodeWorker.py
+//
+// Reads JSON requests, one per line, on stdin:
+//   {"id": 1, "script": "/path/get_glider_folder_listing.js", "args": ["glider", ...]}
+// Runs each script in its own worker thread with process.argv set as if it had
+// been started from the command line, and writes one JSON response per line:
+//   {"id": 1, "returncode": 0, "stdout": "...", "stderr": "..."}
+//
+// This saves starting a node process per call. Scripts in a worker thread
+// still load their own modules. When stdin is closed, the worker exits once
+// the replies for every request already read have been written.
+//
+// Oct-2026, Pat Welch, pat@mousebrains.com
+
+"use strict";
+
+const { Worker } = require("worker_threads");
+const readline = require("readline");
+
+let pending = 0; // Requests without a reply written yet
+let qClosed = false; // stdin is closed
+
+function exitIfDone() {
+    if (qClosed && !pending) process.exit(0);
+}
+
+function reply(msg) {
+    process.stdout.write(JSON.stringify(msg) + "\n", () => {
+        pending -= 1;
+        exitIfDone();
+    });
+}
+
+function collect(stream, chunks) {
+    stream.on("data", (chunk) => chunks.push(chunk));
+}
+
+function runScript(req) {
+    pending += 1;
+    const stdout = [];
+    const stderr = [];
+    let worker;
+    try {
+        worker = new Worker(req.script, {
+            argv: req.args || [],
+            stdout: true,
+            stderr: true,
+        });
+    } catch (err) {
+        reply({ id: req.id, returncode: 1, stdout: "", stderr: String(err) });
+        return;
+    }
+    collect(worker.stdout, stdout);
+    collect(worker.stderr, stderr);
+    let failure = "";
+    worker.on("error", (err) => { failure = String(err && err.stack || err); });
+    worker.on("exit", (code) => {
+        // Let the captured streams drain before replying
+        setImmediate(() => reply({
+            id: req.id,
+            returncode: failure && !code ? 1 : code,
+            stdout: Buffer.concat(stdout).toString("utf8"),
+            stderr: Buffer.concat(stderr).toString("utf8") + failure,
+        }));
+    });
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+
+rl.on("line", (line) => {
+    if (!line.trim()) return;
+    let req;
+    try {
+        req = JSON.parse(line);
+    } catch (err) {
+        process.stderr.write("Unable to parse request " + line + "\n");
+        return;
+    }
+    runScript(req);
+});
+
+rl.on("close", () => {
+    qClosed = true;
+    exitIfDone();
+});